@@ -0,0 +1,268 @@
+"""
+Benchmarks of the hot paths of PloTwist on synthetic data.
+
+Run them from the repository root with e.g.
+
+    python benchmarks/benchmark.py --sizes small medium --output results.json
+
+and compare a later run with the results of an earlier one:
+
+    python benchmarks/benchmark.py --output new.json --compare results.json
+
+All data is generated from a fixed seed, so runs on the same
+machine measure the same work. The results are written as JSON.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import subprocess as sp
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+import matplotlib
+matplotlib.use("agg")
+
+# Benchmark the plotwist of this repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import plotwist.program as ptp
+from plotwist.plot import add_fig, slider_subplots
+from plotwist.program import make
+from plotwist.instructions import comment
+from plotwist.data_handling import sspe_reader, make_dict_from_sspe, NestedDict
+from plotwist.processing import (moving_average, find_best_shift,
+                                 multi_signal_best_shift_mean_distance)
+import matplotlib.pyplot as plt
+
+###########
+# Globals #
+###########
+
+# Seed of the synthetic data
+SEED = 0
+# Benchmarks by name. Each has a parameter for each size
+# and a setup function, that generates the data for a
+# parameter and returns the function that is timed.
+BENCHMARKS: Dict[str, Tuple[Dict[str, int], Callable[[int], Callable]]] = {}
+
+def benchmark(name: str, **sizes: int) -> Callable:
+    """
+    Register a benchmark with a parameter for each size.
+    """
+    def register(setup: Callable[[int], Callable]) -> Callable:
+        BENCHMARKS[name] = (sizes, setup)
+        return setup
+    return register
+
+##############
+# Generators #
+##############
+
+def sspe_log(path: str, n_rows: int, n_cols: int = 20) -> None:
+    """
+    Write a SSPE log like a training run writes it: a header
+    of key paths, a '!' line and rows of ints and floats.
+    """
+    rng = np.random.default_rng(SEED)
+    keys = ["step"] + [f"train/loss_{idx}" for idx in range(n_cols - 1)]
+    values = rng.normal(size=(n_rows, n_cols - 1))
+    with open(path, "w") as file:
+        file.write("!from math import nan\n")
+        file.write(";".join(keys) + "\n")
+        for step, row in enumerate(values):
+            file.write(";".join([str(step), *map(repr, row.tolist())]) + "\n")
+
+def signal(n: int, shift: int = 0) -> np.ndarray:
+    """
+    Returns a noisy periodic signal of length n.
+    """
+    rng = np.random.default_rng(SEED + shift)
+    x = np.arange(shift, n + shift)
+    return np.sin(x / 50) + 0.3 * np.sin(x / 7) + 0.1 * rng.normal(size=n)
+
+##############
+# Benchmarks #
+##############
+
+@benchmark("sspe_reader", small=10_000, medium=100_000, large=1_000_000)
+def _sspe_reader(n_rows: int) -> Callable:
+    path = os.path.abspath("log.sspe")
+    sspe_log(path, n_rows)
+    return lambda: sum(1 for _ in sspe_reader(path))
+
+@benchmark("make_dict_from_sspe", small=10_000, medium=100_000, large=1_000_000)
+def _make_dict_from_sspe(n_rows: int) -> Callable:
+    path = os.path.abspath("log.sspe")
+    sspe_log(path, n_rows)
+    return lambda: make_dict_from_sspe(path)
+
+@benchmark("NestedDict.__getitem__", small=1_000, medium=10_000, large=100_000)
+def _nested_dict_getitem(n_keys: int) -> Callable:
+    dictionary = {f"group_{idx % 10}": {} for idx in range(10)}
+    for idx in range(n_keys):
+        dictionary[f"group_{idx % 10}"][f"key_{idx}"] = [idx]
+    nested = NestedDict(dictionary)
+    keys = [f"group_{idx % 10}/key_{idx}" for idx in range(n_keys)]
+    def run():
+        for key in keys:
+            nested[key]
+    return run
+
+@benchmark("moving_average", small=100_000, medium=1_000_000, large=10_000_000)
+def _moving_average(n: int) -> Callable:
+    values = signal(n)
+    return lambda: moving_average(values, 100)
+
+@benchmark("find_best_shift", small=10_000, medium=100_000, large=1_000_000)
+def _find_best_shift(n: int) -> Callable:
+    signal1, signal2 = signal(n), signal(n, shift=17)
+    return lambda: find_best_shift(signal1, signal2, n // 20)
+
+@benchmark("multi_signal_best_shift_mean_distance", small=10, medium=100, large=1_000)
+def _multi_signal_best_shift_mean_distance(n_signals: int) -> Callable:
+    reference = signal(10_000)
+    signals = [signal(10_000 - idx, shift=idx % 50) for idx in range(n_signals)]
+    return lambda: multi_signal_best_shift_mean_distance(reference, signals, 200)
+
+@benchmark("add_fig", small=1_000, medium=10_000, large=100_000)
+def _add_fig(n_points: int) -> Callable:
+    x = np.linspace(0, 1, n_points)
+    y = signal(n_points)
+    def run():
+        plt.plot(x, y)
+        add_fig()
+        ptp.program.clear()
+    return run
+
+@benchmark("slider_subplots", small=5, medium=20, large=100)
+def _slider_subplots(n_plots: int) -> Callable:
+    x = np.linspace(0, 1, 1_000)
+    y = signal(1_000)
+    def run():
+        with slider_subplots(n_plots) as (figs, axs):
+            for idx, ax in enumerate(axs):
+                ax.plot(x, y + idx)
+        ptp.program.clear()
+    return run
+
+@benchmark("make", small=1_000, medium=10_000, large=100_000)
+def _make(n_items: int) -> Callable:
+    def run():
+        for idx in range(n_items):
+            comment(f"Comment {idx}")
+        make()
+        ptp.program.clear()
+    return run
+
+###########
+# Running #
+###########
+
+def run_benchmark(setup: Callable[[int], Callable], parameter: int,
+                  rounds: int) -> List[float]:
+    """
+    Set up a benchmark, run it once to warm up, then time
+    it for the given number of rounds.
+
+    Args:
+        setup: Callable: the setup function of the benchmark
+        parameter: int: the parameter of the size
+        rounds: int: number of timed rounds
+
+    Returns:
+        list: the seconds of each round
+    """
+    function = setup(parameter)
+    function()
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+def environment() -> Dict[str, Any]:
+    """
+    Returns the versions and the commit the results belong to.
+    """
+    try:
+        commit = sp.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(results: List[Dict[str, Any]], path: str) -> None:
+    """
+    Print the ratios of the median times to those of earlier results.
+    """
+    with open(path) as file:
+        earlier = {(result["name"], result["size"]): result
+                   for result in json.load(file)["results"]}
+    for result in results:
+        old = earlier.get((result["name"], result["size"]))
+        if old is not None and old["parameter"] == result["parameter"]:
+            print(f"{result['name']:40} {result['size']:6} "
+                  f"{result['median'] / old['median']:6.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes',
+                        nargs='*',
+                        default=['small'],
+                        choices=['small', 'medium', 'large'],
+                        help='input sizes to run')
+    parser.add_argument('--only',
+                        nargs='*',
+                        default=list(BENCHMARKS),
+                        choices=list(BENCHMARKS),
+                        help='benchmarks to run')
+    parser.add_argument('--rounds',
+                        type=int,
+                        default=5,
+                        help='timed rounds of each benchmark')
+    parser.add_argument('--output',
+                        type=str,
+                        default=None,
+                        help='JSON file for the results')
+    parser.add_argument('--compare',
+                        type=str,
+                        default=None,
+                        help='JSON file of earlier results to compare with')
+    args = parser.parse_args()
+    results = []
+    # Plots and reports are written to the working directory
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            for name in args.only:
+                sizes, setup = BENCHMARKS[name]
+                for size in args.sizes:
+                    times = run_benchmark(setup, sizes[size], args.rounds)
+                    results.append({
+                        "name": name,
+                        "size": size,
+                        "parameter": sizes[size],
+                        "times": times,
+                        "min": min(times),
+                        "median": float(np.median(times)),
+                    })
+                    print(f"{name:40} {size:6} {results[-1]['median']:10.4f}s")
+        finally:
+            os.chdir(cwd)
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({"environment": environment(), "results": results}, file, indent=2)
+    if args.compare is not None:
+        compare(results, args.compare)
@@ -3,17 +3,128 @@ PloTwist: A Python package for html report generation with minimal code.
 
 Author: Leonard Franz
 """
-# Use matplotlib style
-from matplotlib import style
-style.use(__file__.replace("__init__.py", "style.mplstyle"))
-
-# Fill the namespace
-from .instructions import *
-from .plot import slider_subplots, embedded_subplots, add_fig
-from .program import make
-from .data_handling import make_nested_dict_from_sspe
-from .logging import TimePrint
-from .decorate import decorate, format_large_numbers, C 
+import sys
+import types
+import importlib
+import importlib.abc
+import importlib.machinery
+
+# Modules of the names in the namespace. They are
+# imported on first use, so that e.g. scripts that only
+# use TimePrint or the SSPE loaders do not pay for
+# importing matplotlib.
+_modules = {
+    "title": ".instructions",
+    "subtitle": ".instructions",
+    "comment": ".instructions",
+    "rule": ".instructions",
+    "stacker": ".instructions",
+    "make": ".program",
+    "add_fig": ".plot",
+    "slider_subplots": ".plot",
+    "slider_frames": ".plot",
+    "embedded_subplots": ".plot",
+    "parallel_rendering": ".render",
+    "figure_cache": ".cache",
+    "line_decimation": ".decimate",
+    "make_nested_dict_from_sspe": ".data_handling",
+    "make_runs_from_sspe": ".data_handling",
+    "SSPEFollower": ".data_handling",
+    "TimePrint": ".logging",
+    "Span": ".logging",
+    "profiling": ".logging",
+    "print_profile": ".logging",
+    "export_chrome_trace": ".logging",
+    "decorate": ".decorate",
+    "format_large_numbers": ".decorate",
+    "C": ".decorate",
+}
+
+# Whether the matplotlib style was applied
+_style_used = False
+
+def _use_style() -> None:
+    """
+    Use the matplotlib style of plotwist. It is applied once,
+    when matplotlib is imported (see _StyleFinder).
+    """
+    global _style_used
+    if not _style_used:
+        _style_used = True
+        from matplotlib import style
+        style.use(__file__.replace("__init__.py", "style.mplstyle"))
+
+class _StyleLoader(importlib.abc.Loader):
+    """
+    Loader of matplotlib that applies the style of
+    plotwist as soon as matplotlib is imported.
+    """
+    def __init__(self, loader: importlib.abc.Loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: types.ModuleType) -> None:
+        self.loader.exec_module(module)
+        _use_style()
+
+    def __getattr__(self, name: str):
+        # E.g. the resource reader of the original loader
+        return getattr(self.loader, name)
+
+class _StyleFinder(importlib.abc.MetaPathFinder):
+    """
+    Import hook that applies the style of plotwist when
+    matplotlib is imported, so that figures made with
+    pyplot alone use it, as when plotwist imported
+    matplotlib right away.
+    """
+    def find_spec(self, fullname: str, path, target=None):
+        if fullname != "matplotlib":
+            return None
+        sys.meta_path.remove(self)
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _StyleLoader(spec.loader)
+        return spec
+
+if "matplotlib" in sys.modules:
+    _use_style()
+else:
+    sys.meta_path.insert(0, _StyleFinder())
+
+def __getattr__(name: str):
+    """
+    Import the module of a name on first use.
+    """
+    if name not in _modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(_modules[name], __name__)
+    # Bind all names of the module, since importing it
+    # binds the module itself (e.g. plotwist.decorate)
+    for other, path in _modules.items():
+        if path == _modules[name]:
+            globals()[other] = getattr(module, other)
+    return globals()[name]
+
+def __dir__():
+    return sorted(set(globals()) | set(_modules))
+
+class _Package(types.ModuleType):
+    """
+    The type of the package module. Importing a submodule binds
+    it as an attribute of the package, which would hide the
+    function of the same name (plotwist.decorate), so the
+    function is bound instead.
+    """
+    def __setattr__(self, name: str, value) -> None:
+        if isinstance(value, types.ModuleType) and name in _modules \
+                and value.__name__ == __name__ + _modules[name]:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _Package
 
 # __all__ variable
 __all__ = [
@@ -25,9 +136,19 @@ __all__ = [
     "make",
     "add_fig",
     "slider_subplots",
+    "slider_frames",
     "embedded_subplots",
+    "parallel_rendering",
+    "figure_cache",
+    "line_decimation",
     "make_nested_dict_from_sspe",
+    "make_runs_from_sspe",
+    "SSPEFollower",
     "TimePrint",
+    "Span",
+    "profiling",
+    "print_profile",
+    "export_chrome_trace",
     "decorate",
     "format_large_numbers",
     "C"
@@ -0,0 +1,385 @@
+"""
+Content addressed on-disk cache for rendered figures
+"""
+# Imports
+import os
+import shutil
+import hashlib
+import datetime
+import functools
+from types import CodeType, FunctionType, ModuleType
+from typing import Any
+import numpy as np
+import matplotlib as mpl
+from matplotlib.figure import Figure
+from matplotlib.axes import Axes
+from matplotlib.axis import Axis, Tick
+from matplotlib.lines import Line2D
+from matplotlib.text import Text, Annotation
+from matplotlib.collections import Collection
+from matplotlib.image import _ImageBase
+from matplotlib.patches import Patch
+from matplotlib.legend import Legend
+from matplotlib.offsetbox import OffsetBox
+from matplotlib.artist import Artist
+from matplotlib.ticker import TickHelper
+from matplotlib.colors import Normalize
+from matplotlib.scale import ScaleBase
+from matplotlib.transforms import Transform
+
+###########
+# Globals #
+###########
+
+# Directory of the cache. If it is None, caching is disabled.
+directory: str | None = None
+# Maximum size of the cache directory in bytes
+max_size: int = 512 * 2**20
+# Number of renders that were served from the cache
+hits = 0
+# Number of renders that were not found in the cache
+misses = 0
+# Artist types whose properties are hashed. Figures with
+# artists of other types are not cached.
+ARTISTS = (Figure, Axes, Axis, Tick, Legend, OffsetBox, Line2D,
+           Text, Collection, _ImageBase, Patch)
+# Attributes of locators, formatters, norms and transforms
+# that do not change the rendered output
+TRANSIENT = {"axis", "callbacks", "_parents", "_invalid"}
+
+#############
+# Functions #
+#############
+
+def figure_cache(path: str = ".plotwist_cache",
+                 size: int = 512 * 2**20) -> None:
+    """
+    Cache rendered figures on disk, keyed by a hash of
+    the figure contents. A figure that was rendered
+    before, e.g. in the last run of the report script,
+    is hard linked from the cache instead of being
+    rendered and written.
+
+    Args:
+        path: str: directory of the cache
+        size: int: maximum size of the cache in bytes.
+              The least recently used files are evicted
+              when the cache grows larger.
+
+    Returns:
+        None
+    """
+    global directory, max_size
+    os.makedirs(path, exist_ok=True)
+    directory = path
+    max_size = size
+
+def _feed(hash_: Any, value: Any) -> None:
+    """
+    Feed a value into a hash object.
+    """
+    if isinstance(value, np.ndarray):
+        hash_.update(f"{value.dtype}{value.shape}".encode())
+        if value.dtype == object:
+            hash_.update(repr(value.tolist()).encode())
+        else:
+            hash_.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        hash_.update(b"(")
+        for element in value:
+            _feed(hash_, element)
+        hash_.update(b")")
+    else:
+        hash_.update(repr(value).encode())
+
+class Uncacheable(Exception):
+    """
+    Raised for figures whose rendered output can not be
+    derived reliably from their contents, e.g. with a tick
+    formatter that captures an arbitrary object.
+    """
+
+def _state(value: Any, fig: Figure, seen: set) -> Any:
+    """
+    Returns a hashable description of a value that is part of
+    the state of a figure, e.g. the attributes of a locator or
+    formatter and the code and closure of a formatter function.
+    Artists of the figure itself are described by their type,
+    since their properties are hashed separately.
+    Raises Uncacheable for values that can not be described.
+    """
+    if value is None or isinstance(value, (bool, int, float, complex, str,
+                                           bytes, np.ndarray, np.generic)):
+        return value
+    if isinstance(value, np.ufunc):
+        return value.__name__
+    if isinstance(value, (list, tuple)):
+        return [_state(element, fig, seen) for element in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(repr(_state(element, fig, seen)) for element in value)
+    if isinstance(value, dict):
+        return sorted((repr(key), repr(_state(element, fig, seen)))
+                      for key, element in value.items())
+    if isinstance(value, (range, datetime.date, datetime.timedelta, datetime.tzinfo)):
+        return repr(value)
+    if isinstance(value, ModuleType):
+        return value.__name__
+    if isinstance(value, Artist):
+        if value.get_figure(root=True) is not fig:
+            raise Uncacheable(f"{type(value).__name__} of another figure")
+        return type(value).__name__
+    if isinstance(value, functools.partial):
+        return ["partial", _state(value.func, fig, seen),
+                _state(value.args, fig, seen), _state(value.keywords, fig, seen)]
+    if isinstance(value, FunctionType):
+        # Functions that are already described (recursion)
+        if id(value) in seen:
+            return value.__qualname__
+        seen.add(id(value))
+        return ["function", _state(value.__code__, fig, seen),
+                _state(value.__defaults__, fig, seen),
+                [_state(cell.cell_contents, fig, seen)
+                 for cell in value.__closure__ or ()],
+                # The globals the function uses, e.g. helper functions
+                [(name, _state(value.__globals__[name], fig, seen))
+                 for name in value.__code__.co_names
+                 if name in value.__globals__]]
+    if isinstance(value, CodeType):
+        return [value.co_code, value.co_names,
+                [_state(const, fig, seen) for const in value.co_consts]]
+    if type(value).__module__ == "builtins" and callable(value):
+        return value.__qualname__
+    if isinstance(value, (TickHelper, Normalize, ScaleBase, Transform)):
+        # Locators, formatters, norms, scales and the like
+        return [type(value).__name__,
+                [(name, _state(element, fig, seen))
+                 for name, element in sorted(vars(value).items())
+                 if name not in TRANSIENT]]
+    raise Uncacheable(f"Can not hash a {type(value).__name__}")
+
+def _colormap(artist: Any) -> list:
+    """
+    Returns the colors of the colormap and the norm of
+    an image or collection.
+    """
+    cmap = artist.get_cmap()
+    return [cmap(np.linspace(0, 1, cmap.N)), cmap.get_bad(),
+            cmap.get_under(), cmap.get_over(),
+            _state(artist.norm, artist.get_figure(root=True), set())]
+
+def _properties(artist: Any, fig: Figure) -> list:
+    """
+    Returns the properties of an artist that have an
+    influence on the rendered output. Raises Uncacheable
+    for artists and properties that are not covered.
+    """
+    if not isinstance(artist, ARTISTS):
+        raise Uncacheable(f"Can not hash a {type(artist).__name__}")
+    if artist.get_path_effects() or artist.get_agg_filter() is not None:
+        raise Uncacheable("Can not hash path effects and filters")
+    clip_path = artist.get_clip_path()
+    if clip_path is not None and getattr(clip_path, "_patch", None) \
+            is not getattr(artist.axes, "patch", None):
+        raise Uncacheable("Can not hash a clip path")
+    clip_box = artist.get_clip_box()
+    properties = [type(artist).__name__, artist.get_visible(),
+                  artist.get_zorder(), artist.get_alpha(),
+                  artist.get_transform().get_affine().get_matrix(),
+                  artist.get_clip_on(), clip_box and clip_box.bounds,
+                  artist.get_rasterized(), artist.get_sketch_params(),
+                  artist.get_gid(), artist.get_url()]
+    if isinstance(artist, Axes):
+        properties += [artist.get_position().bounds,
+                       artist.get_xlim(), artist.get_ylim(),
+                       artist.get_xscale(), artist.get_yscale(),
+                       artist.get_aspect(), artist.axison,
+                       artist.get_facecolor()]
+        for axis in (artist.xaxis, artist.yaxis):
+            # The drawn ticks and labels. Computing the labels
+            # also updates the state of the formatters.
+            properties += [axis.get_majorticklocs(),
+                           [label.get_text() for label
+                            in axis.get_majorticklabels()],
+                           axis.get_minorticklocs(),
+                           [label.get_text() for label
+                            in axis.get_minorticklabels()]]
+            properties += [_state(ticker, fig, set()) for ticker in (
+                axis.get_major_locator(), axis.get_major_formatter(),
+                axis.get_minor_locator(), axis.get_minor_formatter())]
+    elif isinstance(artist, Legend):
+        properties += [artist._loc, artist.get_bbox_to_anchor().bounds,
+                       artist.get_frame_on(), artist._ncols]
+    elif isinstance(artist, Line2D):
+        properties += [artist.get_xydata(), artist.get_color(),
+                       artist.get_linewidth(), artist.get_linestyle(),
+                       artist._dash_pattern, artist.get_drawstyle(),
+                       artist.get_solid_capstyle(), artist.get_solid_joinstyle(),
+                       artist.get_dash_capstyle(), artist.get_dash_joinstyle(),
+                       artist.get_marker(), artist.get_markersize(),
+                       artist.get_markerfacecolor(),
+                       artist.get_markerfacecoloralt(),
+                       artist.get_markeredgecolor(),
+                       artist.get_markeredgewidth(), artist.get_fillstyle(),
+                       _state(artist.get_markevery(), fig, set()),
+                       artist.get_label()]
+    elif isinstance(artist, Text):
+        properties += [artist.get_text(), artist.get_position(),
+                       artist.get_color(), artist.get_fontsize(),
+                       artist.get_fontfamily(), artist.get_fontweight(),
+                       artist.get_fontstyle(), artist.get_fontvariant(),
+                       artist.get_stretch(), artist.get_math_fontfamily(),
+                       artist.get_rotation(), artist.get_rotation_mode(),
+                       artist.get_horizontalalignment(),
+                       artist.get_verticalalignment(),
+                       artist._multialignment, artist.get_linespacing(),
+                       artist.get_wrap(), artist.get_usetex()]
+        # The box and the arrow are not children of the text
+        bbox = artist.get_bbox_patch()
+        if bbox is not None:
+            properties += [_state(vars(bbox.get_boxstyle()), fig, set()),
+                           _properties(bbox, fig)]
+        if isinstance(artist, Annotation):
+            properties += [_state(artist.xy, fig, set()),
+                           _state(artist.xycoords, fig, set()),
+                           _state(artist.anncoords, fig, set()),
+                           _state(artist.arrowprops, fig, set())]
+            if artist.arrow_patch is not None:
+                properties.append(_properties(artist.arrow_patch, fig))
+    elif isinstance(artist, Collection):
+        properties += [artist.get_offsets(),
+                       artist.get_offset_transform().get_affine().get_matrix(),
+                       [path.vertices for path in artist.get_paths()],
+                       [path.codes for path in artist.get_paths()],
+                       artist.get_facecolor(), artist.get_edgecolor(),
+                       artist.get_linewidth(), artist.get_linestyle(),
+                       artist.get_capstyle(), artist.get_joinstyle(),
+                       artist.get_hatch(), artist.get_array(),
+                       artist.get_clim(), _colormap(artist)]
+        if hasattr(artist, "get_sizes"):
+            properties.append(artist.get_sizes())
+    elif isinstance(artist, _ImageBase):
+        properties += [artist.get_array(), artist.get_extent(),
+                       artist.get_clim(), _colormap(artist),
+                       artist.get_interpolation(),
+                       artist.get_interpolation_stage(),
+                       artist.get_resample(), artist.get_filternorm(),
+                       artist.get_filterrad(), artist.origin]
+    elif isinstance(artist, Patch):
+        properties += [artist.get_path().vertices, artist.get_path().codes,
+                       artist.get_patch_transform().get_matrix(),
+                       artist.get_facecolor(), artist.get_edgecolor(),
+                       artist.get_linewidth(), artist.get_linestyle(),
+                       artist.get_capstyle(), artist.get_joinstyle(),
+                       artist.get_fill(), artist.get_hatch()]
+    return properties
+
+def fingerprint(fig: Figure, kind: str) -> str | None:
+    """
+    Hash the contents of a figure: its artists and
+    their data, the drawn ticks and tick labels, the
+    state of the locators and formatters, the style,
+    the size and the kind of output (e.g. '.svg' or
+    '.html').
+
+    Args:
+        fig: Figure: the figure
+        kind: str: the kind of output that is rendered
+
+    Returns:
+        str | None: the hex digest of the hash, or None if
+                    the figure can not be cached (see
+                    Uncacheable)
+    """
+    hash_ = hashlib.sha256()
+    _feed(hash_, [kind, tuple(fig.get_size_inches()), fig.dpi])
+    _feed(hash_, sorted((key, value) for key, value
+                        in mpl.rcParams.items() if key != "backend"))
+    try:
+        for artist in fig.findobj():
+            _feed(hash_, _properties(artist, fig))
+    except Uncacheable:
+        return None
+    return hash_.hexdigest()
+
+def entry(key: str, path: str) -> str:
+    """
+    Returns the path in the cache that stores the
+    output with the given key.
+
+    Args:
+        key: str: the cache key of the figure
+        path: str: the output path
+
+    Returns:
+        str: the path of the file in the cache
+    """
+    return os.path.join(directory, key + os.path.splitext(path)[1])
+
+def fetch(key: str, path: str) -> bool:
+    """
+    Put the cached output with the given key at path.
+    The output is hard linked from the cache, so that
+    no data is written, or copied if it can not be
+    linked (e.g. on another file system).
+
+    Args:
+        key: str: the cache key of the figure
+        path: str: the output path
+
+    Returns:
+        bool: whether the output was found in the cache
+    """
+    global hits, misses
+    cached = entry(key, path)
+    if not os.path.exists(cached):
+        misses += 1
+        return False
+    if os.path.lexists(path):
+        os.remove(path)
+    try:
+        os.link(cached, path)
+    except OSError:
+        shutil.copyfile(cached, path)
+    # Mark the file as recently used
+    os.utime(cached)
+    hits += 1
+    return True
+
+def store(path: str, cached: str) -> None:
+    """
+    Store a rendered output in the cache. The copy is
+    renamed into place, so that a reader never sees
+    a half written file.
+
+    Args:
+        path: str: the rendered output
+        cached: str: the path of the file in the cache
+
+    Returns:
+        None
+    """
+    tmp = f"{cached}.{os.getpid()}.tmp"
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, cached)
+
+def evict() -> None:
+    """
+    Remove the least recently used files from the
+    cache until it is not larger than max_size.
+
+    Returns:
+        None
+    """
+    if directory is None:
+        return
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        os.remove(path)
+        total -= size
@@ -19,3 +19,33 @@ window.MathJax = {
 </script>
 </head>
 """
+
+# Loader of the lazy mode of the report. Images and iframes
+# have their source in data-src until they come close to
+# the viewport. It also tells the runtime of the lightweight
+# plots to draw them only once they are close to the viewport.
+LAZY_LOADER = \
+r"""window.plotwist_lazy = true;
+(function() {
+    var load = function(element) {
+        if (!element.getAttribute("src")) {
+            element.src = element.getAttribute("data-src");
+        }
+        element.removeAttribute("data-src");
+    };
+    var elements = document.querySelectorAll("[data-src]");
+    if (!("IntersectionObserver" in window)) {
+        elements.forEach(load);
+        return;
+    }
+    var observer = new IntersectionObserver(function(entries) {
+        entries.forEach(function(entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                load(entry.target);
+            }
+        });
+    }, {rootMargin: "200px"});
+    elements.forEach(function(element) { observer.observe(element); });
+})();
+"""
@@ -2,17 +2,185 @@
 A submodule with lots of helper functions for handling data
 """
 # Imports
-from typing import Any, Dict, Generator, List
+import io
+import os
+import re
+import glob
+import json
+import locale
+import shutil
+import hashlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Generator, List, Sequence, Tuple
 import numpy as np
 
+# Constants
+# Cells matching these patterns are number literals that
+# can be parsed with int() and float() instead of eval()
+INT_PATTERN = re.compile(r"[ \t]*[-+]?(?:0|[1-9][0-9]{0,17})[ \t\r\n]*")
+FLOAT_PATTERN = re.compile(r"[ \t]*[-+]?(?:(?:[0-9]+\.[0-9]*|\.[0-9]+)"
+                           r"(?:[eE][-+]?[0-9]+)?|[0-9]+[eE][-+]?[0-9]+)"
+                           r"[ \t\r\n]*")
+# Patterns for checks of whole columns, which are joined
+# and enclosed with ';' (it can not appear in a cell).
+# If a column only has characters of a number alphabet
+# and NumPy parses all of its cells, the cells are
+# number literals.
+INT_ALPHABET = re.compile(r"[-+0-9 \t\r\n;]*")
+FLOAT_ALPHABET = re.compile(r"[-+0-9.eE \t\r\n;]*")
+# Python does not allow leading zeros in int literals
+LEADING_ZERO = re.compile(r";[ \t]*[-+]?0[0-9]")
+# A cell without '.' and exponent is an int literal
+INT_CELL = re.compile(r";[^.eE;]*;")
+# Number of rows used to infer the type of a column
+TYPE_INFERENCE_ROWS = 32
+# Approximate number of bytes read and parsed at once
+CHUNK_SIZE = 2**22
+# Number of first bytes of a followed file that are
+# compared to notice when the file is rewritten
+HEAD_SIZE = 4096
+
 # Classes
+class Column:
+    """
+    A leaf of a NestedDict: a contiguous, typed NumPy
+    array that can grow at its end.
+    """
+    def __init__(self, values: Any):
+        """
+        Args:
+            values (Any): The values of the column. Raises
+                a ValueError if they do not form an array
+                of at least one dimension.
+        """
+        # Copy arrays, so that the column does not share memory
+        # with the values of the caller. Read-only memory maps,
+        # e.g. of the sidecar cache, are kept, and only copied
+        # when the column is extended.
+        if isinstance(values, np.memmap) and not values.flags.writeable:
+            self.buffer = values
+        else:
+            self.buffer = np.array(values)
+        if self.buffer.ndim == 0:
+            raise ValueError("A column needs at least one dimension")
+        self.length = len(self.buffer)
+        self._update_view()
+
+    def _update_view(self) -> None:
+        """
+        Make the read-only view of the filled part of the buffer.
+        """
+        self.array = self.buffer[:self.length]
+        self.array.flags.writeable = False
+
+    def extend(self, values: list) -> None:
+        """
+        Append values to the column. The buffer grows
+        geometrically, so appending is amortized linear
+        in the number of new values. Raises a ValueError
+        if the values do not fit into one array with the
+        old values.
+
+        If the new values have no common type with the old
+        ones (e.g. strings after numbers), the array is
+        built again from the stored values. Ints that were
+        already promoted to floats then stay floats.
+
+        Args:
+            values (list): The new values.
+        """
+        if len(values) == 0:
+            return
+        new = np.array(values)
+        try:
+            dtype = np.result_type(self.buffer, new)
+        except TypeError:
+            dtype = None
+        if dtype is None or new.shape[1:] != self.buffer.shape[1:]:
+            # Build the array again like np.array
+            # does for the list of all values
+            combined = np.array(self.array.tolist() + list(values))
+            if combined.ndim == 0:
+                raise ValueError("Values do not form a column")
+            self.buffer = combined
+            self.length = len(combined)
+            self._update_view()
+            return
+        length = self.length + len(new)
+        if dtype != self.buffer.dtype or length > len(self.buffer):
+            capacity = max(length, 2 * len(self.buffer))
+            buffer = np.empty((capacity, *self.buffer.shape[1:]), dtype=dtype)
+            buffer[:self.length] = self.buffer[:self.length]
+            self.buffer = buffer
+        self.buffer[self.length:length] = new
+        self.length = length
+        self._update_view()
+
+def _copy_dicts(dictionary: Dict) -> Dict:
+    """
+    Copy the dictionaries and lists of a nested dictionary.
+    """
+    return {key: _copy_dicts(value) if isinstance(value, dict)
+            else list(value) if isinstance(value, list) else value
+            for key, value in dictionary.items()}
+
 class NestedDict:
     """
     A class that provides quallity of life improvements
     for working with nested dictionaries.
+
+    The leaves are stored as contiguous, read-only NumPy
+    arrays that are built once, and the key paths are
+    resolved through a flat index, so repeated access
+    neither walks the dictionary nor copies data.
+
+    The returned arrays are read-only, since they are the
+    stored data. To change the values, change a copy, e.g.
+    x = d["a"].copy(); x += 1. The given dictionary is
+    copied and left unchanged, except for read-only memory
+    maps, which are kept until they are extended.
     """
-    def __init__(self, dictionary: Dict):
+    def __init__(self, dictionary: Dict,
+                 _root: "NestedDict | None" = None, _prefix: str = ""):
+        if _root is None:
+            dictionary = _copy_dicts(dictionary)
         self.dictionary = dictionary
+        self._root = _root or self
+        self._prefix = _prefix
+        if _root is None:
+            # Flat index from key paths to the leaves and
+            # to the NestedDicts of the inner dictionaries
+            self.index: Dict[str, Any] = {}
+            self._columns: Dict[str, Column] = {}
+            self._build(dictionary, "")
+
+    def _build(self, dictionary: Dict, prefix: str) -> None:
+        """
+        Index a dictionary and turn its leaves into columns.
+        """
+        for key, value in dictionary.items():
+            key_path = prefix + key
+            if isinstance(value, dict):
+                self.index[key_path] = NestedDict(value, self, key_path + "/")
+                self._build(value, key_path + "/")
+            else:
+                self._set_leaf(dictionary, key, key_path, value)
+
+    def _set_leaf(self, dictionary: Dict, key: str,
+                  key_path: str, value: Any) -> None:
+        """
+        Store a leaf as a column. Values that do
+        not form an array are kept as they are.
+        """
+        try:
+            self._columns[key_path] = Column(value)
+            value = self._columns[key_path].array
+        except ValueError:
+            self._columns.pop(key_path, None)
+        dictionary[key] = value
+        self.index[key_path] = value
 
     def __getitem__(self, key: str) -> Any:
         """
@@ -25,20 +193,20 @@ class NestedDict:
         if type(key) != str:
             raise TypeError(f"Key must be a string but "
                             f"is {type(key)}")
+        try:
+            return self._root.index[self._prefix + key]
+        except KeyError:
+            pass
+        # Find the missing key for the error message
         visited = []
         current = self.dictionary
         for key in key.split('/'):
-            if key not in current:
+            if not isinstance(current, dict) or key not in current:
                 raise KeyError(f"Key '{key}' not present "
                                f"in {'/'.join(visited)}")
             visited.append(key)
             current = current[key]
-        if isinstance(current, dict):
-            return NestedDict(current)
-        try:
-            return np.array(current)
-        except:
-            return current
+        raise KeyError(f"Key '{'/'.join(visited)}' not present")
 
     def subkeys(self, key: str) -> List[str]:
         """
@@ -47,6 +215,231 @@ class NestedDict:
         """
         return list(self[key].dictionary.keys())
 
+    def extend(self, key_paths: List[List[str]], columns: List[list]) -> None:
+        """
+        Append columns of values in place to the
+        leaves at the given (split) key paths.
+        """
+        paths = ["/".join(key_path) for key_path in key_paths[:len(columns)]]
+        if len(set(paths)) == len(paths):
+            new = dict(zip(paths, columns))
+        else:
+            # Keep the order of the values if a
+            # key path appears more than once
+            new = {}
+            for values in zip(*columns):
+                for path, value in zip(paths, values):
+                    new.setdefault(path, []).append(value)
+        for path, values in new.items():
+            self._root._extend_leaf(self._prefix + path, values)
+
+    def _extend_leaf(self, key_path: str, values: list) -> None:
+        """
+        Append values to the leaf at a key path.
+        """
+        *keys, leaf = key_path.split('/')
+        dictionary = self.dictionary
+        for idx, key in enumerate(keys):
+            if key not in dictionary:
+                dictionary[key] = {}
+                prefix = "/".join(keys[:idx + 1])
+                self.index[prefix] = NestedDict(dictionary[key], self,
+                                                prefix + "/")
+            dictionary = dictionary[key]
+        if key_path in self._columns:
+            column = self._columns[key_path]
+            try:
+                column.extend(values)
+                dictionary[leaf] = self.index[key_path] = column.array
+            except ValueError:
+                # The values do not form an array anymore
+                self._set_leaf(dictionary, leaf, key_path,
+                               column.array.tolist() + list(values))
+        elif isinstance(dictionary.get(leaf), list):
+            dictionary[leaf].extend(values)
+        else:
+            self._set_leaf(dictionary, leaf, key_path, list(values))
+
+    def clear(self) -> None:
+        """
+        Remove all keys.
+        """
+        self.dictionary.clear()
+        self.index.clear()
+        self._columns.clear()
+
+class SSPEParser:
+    """
+    Parses lines of a SSPE file column by column. The
+    parser keeps the namespaces of the '!' lines, so
+    that a file can be parsed in several parts.
+    """
+    def __init__(self, skip_cols: List[int] = []):
+        self.skip = set(skip_cols)
+        self._globals = {}
+        self._locals = {}
+        self.n_cols = None
+
+    def _layout(self) -> Tuple[List[int], int]:
+        """
+        Returns the indices of the columns that are parsed
+        and the number of cells a line needs to have a
+        value for each of them.
+        """
+        kept = [idx for idx in range(self.n_cols) if idx not in self.skip]
+        return kept, (kept[-1] + 1 if kept else 0)
+
+    def _maxsplit(self) -> int:
+        """
+        Returns the maxsplit argument for splitting lines,
+        so that cells after the last parsed column are
+        not split.
+        """
+        _, n_needed = self._layout()
+        return n_needed if n_needed < self.n_cols else -1
+
+    def parse(self, lines: List[str]) -> Generator[list[Any], None, None]:
+        """
+        Parse complete lines of a SSPE file. The columns to
+        skip may be changed while the header is yielded.
+
+        Args:
+            lines (List[str]): The lines.
+
+        Yields:
+            list: The values of the header line, if it is
+                  among the lines. Then, for each block of
+                  lines, a list with the values of each
+                  column.
+        """
+        rows = []
+        maxsplit = -1 if self.n_cols is None else self._maxsplit()
+        for line in lines:
+            # Parse the lines before executing a line
+            # that starts with a "!" character, as it
+            # may change the namespaces.
+            if line[0] == "!":
+                yield from self._parse_rows(rows)
+                rows = []
+                exec(line[1:], self._globals, self._locals)
+            elif self.n_cols is None:
+                # The header is parsed cell by cell
+                cells = line.split(";")
+                self.n_cols = len(cells)
+                yield [_parse_cell(cell, self._globals, self._locals)
+                       for idx, cell in enumerate(cells)
+                       if idx not in self.skip]
+                maxsplit = self._maxsplit()
+            else:
+                rows.append(line.split(";", maxsplit))
+        yield from self._parse_rows(rows)
+
+    def _parse_rows(self, rows: List[List[str]]) -> Generator[list[Any], None, None]:
+        """
+        Parse split lines. Runs of lines that have a cell
+        for each parsed column are parsed column by column,
+        shorter lines one by one.
+        """
+        if not rows:
+            return
+        kept, n_needed = self._layout()
+        start = 0
+        for end in range(len(rows) + 1):
+            if end < len(rows) and len(rows[end]) >= n_needed:
+                continue
+            if start < end:
+                columns = list(zip(*rows[start:end]))
+                yield [_parse_column(columns[idx], self._globals, self._locals)
+                       for idx in kept]
+            if end < len(rows):
+                yield [[_parse_cell(cell, self._globals, self._locals)]
+                       for idx, cell in enumerate(rows[end])
+                       if idx not in self.skip]
+            start = end + 1
+
+class SSPEFollower:
+    """
+    Follows a SSPE file that is appended to, e.g. the log
+    of a running training. Each update only parses the
+    lines that were appended since the last update and
+    extends the NestedDict in place.
+    """
+    def __init__(self,
+                 path: str,
+                 skip_if_contains: str | None = None,
+                 include: str | List[str] | None = None,
+                 exclude: str | List[str] | None = None):
+        """
+        Args:
+            path (str): The path to the file.
+            skip_if_contains (str | None): Skip the key paths
+                that contain this key.
+            include (str | List[str] | None): Only read the key
+                paths matching one of these patterns.
+            exclude (str | List[str] | None): Skip the key paths
+                matching one of these patterns.
+        """
+        self.path = path
+        self.skip_if_contains = skip_if_contains
+        self.include = include
+        self.exclude = exclude
+        self.nested_dict = NestedDict({})
+        self._reset()
+
+    def _reset(self) -> None:
+        """
+        Start reading the file from the beginning.
+        """
+        self.offset = 0
+        # Identity (device, inode) and first bytes of the
+        # file, to notice when it is replaced by a new run
+        self.identity: Tuple[int, int] | None = None
+        self.head = b""
+        self.parser = SSPEParser()
+        self.key_paths: List[List[str]] | None = None
+        self.nested_dict.clear()
+
+    def update(self) -> NestedDict:
+        """
+        Parse the complete lines that were appended to
+        the file since the last update. If the file was
+        replaced (another inode), got shorter or its first
+        bytes changed, e.g. because a new run writes it,
+        it is read again from the beginning.
+
+        Returns:
+            NestedDict: The dictionary with all lines
+                        read so far
+        """
+        with open(self.path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            if self.offset and ((stat.st_dev, stat.st_ino) != self.identity
+                                or stat.st_size < self.offset
+                                or file.read(len(self.head)) != self.head):
+                self._reset()
+            file.seek(self.offset)
+            data = file.read()
+        # Only parse complete lines
+        data = data[:data.rfind(b"\n") + 1]
+        if self.offset == 0:
+            self.identity = (stat.st_dev, stat.st_ino)
+            self.head = data[:HEAD_SIZE]
+        self.offset += len(data)
+        # Decode like open() does in text mode
+        lines = io.StringIO(
+            data.decode(locale.getpreferredencoding(False)),
+            newline=None
+        ).readlines()
+        for values in self.parser.parse(lines):
+            if self.key_paths is None:
+                self.key_paths = _read_header(
+                    self.parser, values, self.skip_if_contains,
+                    self.include, self.exclude
+                )
+            else:
+                self.nested_dict.extend(self.key_paths, values)
+        return self.nested_dict
+
 # Functions
 def sspe_reader(
         path: str, 
@@ -88,9 +481,184 @@ def sspe_reader(
                     except:
                         return_value.append(value)
                 yield return_value
-        
 
-def make_dict_from_sspe(path: str, skip_if_contains: str | None = None) -> Dict[str, Dict[str, Any] | Any]:
+
+def _parse_cell(value: str, _globals: Dict, _locals: Dict) -> Any:
+    """
+    Parse a cell like sspe_reader does, but parse
+    number literals without eval.
+    """
+    if INT_PATTERN.fullmatch(value):
+        return int(value)
+    if FLOAT_PATTERN.fullmatch(value):
+        return float(value)
+    try:
+        return eval(value, _globals, _locals)
+    except Exception:
+        return value
+
+def _parse_column(cells: Sequence[str], _globals: Dict, _locals: Dict) -> list:
+    """
+    Parse the cells of a column. The type of the column
+    is inferred from its first rows. Columns of int or
+    float literals are parsed in bulk, all other
+    columns cell by cell.
+    """
+    sample = ";".join(cells[:TYPE_INFERENCE_ROWS])
+    if INT_ALPHABET.fullmatch(sample):
+        column = f";{';'.join(cells)};"
+        if INT_ALPHABET.fullmatch(column) \
+                and not LEADING_ZERO.search(column):
+            try:
+                return np.array(cells, dtype=np.int64).tolist()
+            except (ValueError, OverflowError):
+                pass
+    elif FLOAT_ALPHABET.fullmatch(sample):
+        column = f";{';'.join(cells)};"
+        if FLOAT_ALPHABET.fullmatch(column) \
+                and not INT_CELL.search(column):
+            try:
+                return np.array(cells, dtype=np.float64).tolist()
+            except ValueError:
+                pass
+    return [_parse_cell(cell, _globals, _locals) for cell in cells]
+
+def sspe_column_reader(
+        path: str,
+        skip_cols: List[int] = []
+    ) -> Generator[list[Any], None, None]:
+    """
+    Read a file in the Semicolon Separated Python 
+    Expression (SSPE) format column by column. The
+    values are the same as the ones of sspe_reader,
+    but number literals are parsed without eval.
+
+    Args:
+        path (str): The path to the file.
+        skip_cols (List[int]): Columns to leave out.
+
+    Yields:
+        list: First the values of the header line.
+              Then, for each block of lines, a list
+              with the values of each column.
+    """
+    parser = SSPEParser(skip_cols)
+    with open(path) as file:
+        while lines := file.readlines(CHUNK_SIZE):
+            yield from parser.parse(lines)
+
+def _extend(
+        dictionary: Dict,
+        key_paths: List[List[str]],
+        columns: List[list]
+    ) -> None:
+    """
+    Append the values of columns to the lists at
+    the key paths of a nested dictionary.
+    """
+    leaves = []
+    for key_path in key_paths[:len(columns)]:
+        current = dictionary
+        for key in key_path[:-1]:
+            current = current.setdefault(key, {})
+        leaves.append(current.setdefault(key_path[-1], []))
+    if len(set(map(id, leaves))) == len(leaves):
+        for leaf, column in zip(leaves, columns):
+            leaf.extend(column)
+    else:
+        # Appending whole columns would change the order of
+        # the values if a key path appears more than once
+        for values in zip(*columns):
+            for leaf, value in zip(leaves, values):
+                leaf.append(value)
+
+def match_key_path(key_path: str, pattern: str) -> bool:
+    """
+    Check whether a key path matches a glob pattern like
+    'eval/*/reward'. The wildcards '*', '?' and '[...]'
+    match within one key of the path, while a '**' key
+    matches any number of keys.
+
+    Args:
+        key_path (str): The key path.
+        pattern (str): The pattern.
+
+    Returns:
+        bool: Whether the key path matches
+    """
+    return _match_keys(key_path.rstrip("\n").split('/'), pattern.split('/'))
+
+def _match_keys(keys: List[str], patterns: List[str]) -> bool:
+    """
+    Match split key paths against split patterns.
+    """
+    if not patterns:
+        return not keys
+    if patterns[0] == "**":
+        return any(_match_keys(keys[idx:], patterns[1:])
+                   for idx in range(len(keys) + 1))
+    return bool(keys) and fnmatchcase(keys[0], patterns[0]) \
+        and _match_keys(keys[1:], patterns[1:])
+
+def keep_key_path(
+        key_path: List[str],
+        skip_if_contains: str | None = None,
+        include: str | List[str] | None = None,
+        exclude: str | List[str] | None = None
+    ) -> bool:
+    """
+    Check whether a (split) key path is selected.
+
+    Args:
+        key_path (List[str]): The key path.
+        skip_if_contains (str | None): Skip the key paths
+            that contain this key.
+        include (str | List[str] | None): Only keep the key
+            paths matching one of these patterns.
+        exclude (str | List[str] | None): Skip the key paths
+            matching one of these patterns.
+
+    Returns:
+        bool: Whether the key path is kept
+    """
+    if skip_if_contains and skip_if_contains in key_path:
+        return False
+    joined = "/".join(key_path)
+    if include is not None:
+        include = [include] if isinstance(include, str) else include
+        if not any(match_key_path(joined, pattern) for pattern in include):
+            return False
+    if exclude is not None:
+        exclude = [exclude] if isinstance(exclude, str) else exclude
+        if any(match_key_path(joined, pattern) for pattern in exclude):
+            return False
+    return True
+
+def _read_header(
+        parser: SSPEParser,
+        header: List[Any],
+        skip_if_contains: str | None,
+        include: str | List[str] | None,
+        exclude: str | List[str] | None
+    ) -> List[List[str]]:
+    """
+    Make the key paths from the header and tell the
+    parser to skip the columns that are not selected.
+    """
+    key_paths = [path.split('/') for path in header]
+    parser.skip = {idx for idx, key_path in enumerate(key_paths)
+                   if not keep_key_path(key_path, skip_if_contains,
+                                        include, exclude)}
+    return [key_path for idx, key_path in enumerate(key_paths)
+            if idx not in parser.skip]
+
+def make_dict_from_sspe(
+        path: str,
+        skip_if_contains: str | None = None,
+        fast: bool = True,
+        include: str | List[str] | None = None,
+        exclude: str | List[str] | None = None
+    ) -> Dict[str, Dict[str, Any] | Any]:
     """
     Make a nested dictionary from a SSPE file. The first 
     line of the file should be the key paths for The
@@ -99,25 +667,51 @@ def make_dict_from_sspe(path: str, skip_if_contains: str | None = None) -> Dict[
 
     Args:
         path (str): The path to the file.
+        skip_if_contains (str | None): Skip the key paths
+            that contain this key.
+        fast (bool): Parse number literals without eval (see
+            SSPEParser) and read the file in a single pass,
+            in which only the selected columns are split and
+            parsed. Gives the same dictionary as sspe_reader.
+        include (str | List[str] | None): Only read the key
+            paths matching one of these patterns, e.g.
+            'eval/*/reward' (see match_key_path).
+        exclude (str | List[str] | None): Skip the key paths
+            matching one of these patterns.
     
     Returns:
         dict: The dictionary 
     """
+    # Initialize the dictionary
+    dictionary = {}
+    if fast:
+        parser = SSPEParser()
+        key_paths = None
+        with open(path) as file:
+            while lines := file.readlines(CHUNK_SIZE):
+                for values in parser.parse(lines):
+                    if key_paths is None:
+                        key_paths = _read_header(parser, values,
+                                                 skip_if_contains,
+                                                 include, exclude)
+                    else:
+                        _extend(dictionary, key_paths, values)
+        return dictionary
+
     # Get the key paths from the header
     reader = sspe_reader(path)
     key_paths = [path.split('/') 
                  for path in next(reader)]
 
-    # Remove key paths that contain the skip_if_contains
-    if skip_if_contains:
-        cols_to_skip = [i for i, key_path in enumerate(key_paths) 
-                        if skip_if_contains in key_path]
+    # Remove key paths that are not selected
+    cols_to_skip = [i for i, key_path in enumerate(key_paths) 
+                    if not keep_key_path(key_path, skip_if_contains,
+                                         include, exclude)]
+    if cols_to_skip:
         reader = sspe_reader(path, cols_to_skip)
         key_paths = [path.split('/')
                      for path in next(reader)]
 
-    # Initialize the dictionary
-    dictionary = {}
     # Iterate over the key paths and values
     for values in reader:
         for key_path, value in zip(key_paths, values):
@@ -130,9 +724,162 @@ def make_dict_from_sspe(path: str, skip_if_contains: str | None = None) -> Dict[
                 current[key_path[-1]] = [value]
     return dictionary
 
+def flatten_dict(dictionary: Dict, prefix: str = "") -> Dict[str, Any]:
+    """
+    Flatten a nested dictionary to a dictionary
+    that maps key paths like 'a/b/c' to the leaves.
+
+    Args:
+        dictionary (dict): The nested dictionary.
+        prefix (str): Key path of the dictionary.
+
+    Returns:
+        dict: The flat dictionary
+    """
+    flat = {}
+    for key, value in dictionary.items():
+        key_path = f"{prefix}/{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten_dict(value, key_path))
+        else:
+            flat[key_path] = value
+    return flat
+
+def nest_dict(flat: Dict[str, Any]) -> Dict[str, Dict[str, Any] | Any]:
+    """
+    Make a nested dictionary from a dictionary that
+    maps key paths like 'a/b/c' to the leaves.
+
+    Args:
+        flat (dict): The flat dictionary.
+
+    Returns:
+        dict: The nested dictionary
+    """
+    dictionary = {}
+    for key_path, value in flat.items():
+        *keys, leaf = key_path.split('/')
+        current = dictionary
+        for key in keys:
+            current = current.setdefault(key, {})
+        current[leaf] = value
+    return dictionary
+
+def _file_stat(path: str) -> Dict[str, Any]:
+    """
+    Returns the size, modification time and content
+    hash of a file.
+    """
+    hash_ = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(2**20), b""):
+            hash_.update(chunk)
+    stat = os.stat(path)
+    return {"size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": hash_.hexdigest()}
+
+def write_sspe_cache(path: str) -> Dict[str, Any]:
+    """
+    Parse a SSPE file and write its columns to a binary
+    sidecar cache. The cache is a directory next to the
+    file (path + '.npcache') that holds a .npy file per
+    key path and a meta.json file, which records the
+    size, modification time and content hash of the
+    SSPE file.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        dict: The flat dictionary of the file, mapping
+              key paths to the columns.
+    """
+    stat = _file_stat(path)
+    flat = flatten_dict(make_dict_from_sspe(path))
+    # Store the leaves as NestedDict returns them: as an
+    # array if possible and as a list otherwise
+    columns = []
+    for idx, (key_path, values) in enumerate(flat.items()):
+        try:
+            flat[key_path] = np.array(values)
+            kind = "object" if flat[key_path].dtype == object else "array"
+        except ValueError:
+            kind = "list"
+        columns.append({"key_path": key_path,
+                        "file": f"col_{idx}.npy",
+                        "kind": kind})
+    # Write the cache into a fresh directory and
+    # move it into place when it is complete
+    cache_dir = path + ".npcache"
+    tmp_dir = f"{cache_dir}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        for column in columns:
+            value = flat[column["key_path"]]
+            if column["kind"] == "list":
+                value = np.empty(len(value), dtype=object)
+                value[:] = flat[column["key_path"]]
+            np.save(os.path.join(tmp_dir, column["file"]), value,
+                    allow_pickle=column["kind"] != "array")
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as file:
+            json.dump({**stat, "columns": columns}, file)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+    except OSError:
+        # Not being able to write the cache is not an error
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return flat
+
+def read_sspe_cache(path: str) -> Dict[str, Any] | None:
+    """
+    Read the binary sidecar cache of a SSPE file. The
+    cache is valid if the size of the file is unchanged
+    and if either its modification time or its content
+    hash is unchanged. Numeric and string columns are
+    memory-mapped instead of read.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        dict | None: The flat dictionary of the file, mapping
+                     key paths to the columns, or None if
+                     there is no valid cache.
+    """
+    cache_dir = path + ".npcache"
+    try:
+        with open(os.path.join(cache_dir, "meta.json")) as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(path)
+    if stat.st_size != meta["size"]:
+        return None
+    if stat.st_mtime_ns != meta["mtime_ns"]:
+        # The file was touched, compare the contents
+        if _file_stat(path)["sha256"] != meta["sha256"]:
+            return None
+        meta["mtime_ns"] = stat.st_mtime_ns
+        with open(os.path.join(cache_dir, "meta.json"), "w") as file:
+            json.dump(meta, file)
+    flat = {}
+    for column in meta["columns"]:
+        file = os.path.join(cache_dir, column["file"])
+        if column["kind"] == "array":
+            flat[column["key_path"]] = np.load(file, mmap_mode="r")
+        elif column["kind"] == "object":
+            flat[column["key_path"]] = np.load(file, allow_pickle=True)
+        else:
+            flat[column["key_path"]] = list(np.load(file, allow_pickle=True))
+    return flat
+
 def make_nested_dict_from_sspe(
         path: str,
-        skip_if_contains: str | None = None
+        skip_if_contains: str | None = None,
+        cache: bool = False,
+        include: str | List[str] | None = None,
+        exclude: str | List[str] | None = None
     ) -> NestedDict:
     """
     Make a NestedDict class from a SSPE file. The first 
@@ -142,8 +889,167 @@ def make_nested_dict_from_sspe(
 
     Args:
         path (str): The path to the file.
+        skip_if_contains (str | None): Skip the key paths
+            that contain this key.
+        cache (bool): Keep a binary sidecar cache of the
+            parsed file (see write_sspe_cache) and load
+            from it while the file is unchanged. The cache
+            holds all columns of the file.
+        include (str | List[str] | None): Only read the key
+            paths matching one of these patterns, e.g.
+            'eval/*/reward' (see match_key_path).
+        exclude (str | List[str] | None): Skip the key paths
+            matching one of these patterns.
     
     Returns:
         NestedDict: The dictionary 
     """
-    return NestedDict(make_dict_from_sspe(path, skip_if_contains))
+    if not cache:
+        return NestedDict(make_dict_from_sspe(path, skip_if_contains,
+                                              include=include,
+                                              exclude=exclude))
+    flat = read_sspe_cache(path)
+    if flat is None:
+        flat = write_sspe_cache(path)
+    flat = {key_path: value for key_path, value in flat.items()
+            if keep_key_path(key_path.split('/'), skip_if_contains,
+                             include, exclude)}
+    return NestedDict(nest_dict(flat))
+
+def _run_names(paths: List[str]) -> List[str]:
+    """
+    Name each run by the path of its file relative to the
+    common directory of all files, without the extension.
+    """
+    if len(paths) == 1:
+        return [os.path.splitext(os.path.basename(paths[0]))[0]]
+    common = os.path.commonpath([os.path.abspath(os.path.dirname(path))
+                                 for path in paths])
+    return [os.path.splitext(os.path.relpath(os.path.abspath(path), common))[0]
+            for path in paths]
+
+def _load_run(
+        path: str,
+        skip_if_contains: str | None,
+        include: str | List[str] | None,
+        exclude: str | List[str] | None,
+        cache: bool
+    ) -> Dict[str, Any]:
+    """
+    Load a SSPE file into a flat dictionary of columns
+    (runs in a worker process of make_runs_from_sspe).
+    """
+    nested_dict = make_nested_dict_from_sspe(path, skip_if_contains, cache,
+                                             include, exclude)
+    return {key_path: value for key_path, value in nested_dict.index.items()
+            if not isinstance(value, NestedDict)}
+
+def _stack_runs(runs: Dict[str, Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Stack the columns that line up in all runs, i.e. that
+    are arrays of the same shape in each of them.
+    """
+    stacked = {}
+    skipped = []
+    first, *others = runs.values()
+    for key_path, value in first.items():
+        values = [value] + [flat.get(key_path) for flat in others]
+        if all(isinstance(value, np.ndarray) and value.shape == values[0].shape
+               for value in values):
+            stacked[key_path] = np.stack(values)
+        else:
+            skipped.append(key_path)
+    skipped += sorted({key_path for flat in others
+                       for key_path in flat if key_path not in first})
+    if skipped:
+        warnings.warn(f"Columns that do not line up in all runs "
+                      f"were not stacked: {', '.join(skipped)}")
+    return stacked
+
+def make_runs_from_sspe(
+        paths: str | List[str],
+        skip_if_contains: str | None = None,
+        stack: bool = False,
+        workers: int | None = None,
+        cache: bool = False,
+        include: str | List[str] | None = None,
+        exclude: str | List[str] | None = None
+    ) -> NestedDict:
+    """
+    Load many SSPE files, e.g. one per seed of a sweep,
+    optionally in parallel. Each file is parsed like in
+    make_nested_dict_from_sspe, with workers in a worker
+    process.
+
+    A file that can not be loaded does not stop the others.
+    A warning is given instead and the file is left out.
+
+    Args:
+        paths (str | List[str]): The paths to the files. Glob
+            patterns like 'runs/*.sspe' or 'runs/**/*.sspe'
+            (any depth) are expanded.
+        skip_if_contains (str | None): Skip the key paths
+            that contain this key.
+        stack (bool): Instead of keying the runs by name,
+            stack the columns that line up in all runs
+            into arrays with the runs as first axis.
+        workers (int | None): The maximum number of worker
+            processes. None and 0 load the files one after
+            another in this process, which is the default.
+            The processes import the __main__ module again
+            when they are spawned (the default on macOS and
+            Windows), so a script that uses workers needs an
+            if __name__ == "__main__" guard.
+        cache (bool): Use the sidecar caches of the files
+            (see make_nested_dict_from_sspe).
+        include (str | List[str] | None): Only read the key
+            paths matching one of these patterns.
+        exclude (str | List[str] | None): Skip the key paths
+            matching one of these patterns.
+
+    Returns:
+        NestedDict: The runs keyed by run name, which is the
+            path of the file without its extension relative
+            to the common directory of the files. With stack,
+            the stacked columns. The attribute 'runs' lists the
+            loaded runs (in the order of the stacked axis) and
+            'errors' maps the paths that failed to their error.
+    """
+    paths = [paths] if isinstance(paths, str) else paths
+    expanded = []
+    for path in paths:
+        expanded += sorted(glob.glob(path, recursive=True)) if glob.has_magic(path) else [path]
+    # Keep the first of duplicate paths
+    paths = list(dict.fromkeys(expanded))
+    names = _run_names(paths) if paths else []
+    arguments = (skip_if_contains, include, exclude, cache)
+    runs: Dict[str, Dict[str, Any]] = {}
+    errors: Dict[str, Exception] = {}
+    if not workers:
+        for name, path in zip(names, paths):
+            try:
+                runs[name] = _load_run(path, *arguments)
+            except Exception as error:
+                errors[path] = error
+    else:
+        workers = min(workers, max(len(paths), 1))
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(_load_run, path, *arguments)
+                       for path in paths]
+            for name, path, future in zip(names, paths, futures):
+                try:
+                    runs[name] = future.result()
+                except Exception as error:
+                    errors[path] = error
+    for path, error in errors.items():
+        warnings.warn(f"Could not load {path}: {error!r}")
+    if stack:
+        nested_dict = NestedDict(nest_dict(_stack_runs(runs)) if runs else {})
+    else:
+        nested_dict = NestedDict(nest_dict({
+            f"{name}/{key_path}": value
+            for name, flat in runs.items() for key_path, value in flat.items()
+        }))
+    nested_dict.runs = list(runs)
+    nested_dict.errors = errors
+    return nested_dict
@@ -0,0 +1,131 @@
+"""
+Decimation of the lines of figures before they are rendered
+"""
+# Imports
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+###########
+# Globals #
+###########
+
+# Number of points per pixel column of a line above which
+# the line is decimated. If it is None, decimation is disabled.
+points_per_pixel: float | None = None
+# Number of points that were removed from lines
+removed = 0
+
+#############
+# Functions #
+#############
+
+def line_decimation(budget: float | None = 4) -> None:
+    """
+    Decimate lines with many points before their figure
+    is rendered. The axes are split into columns of equal
+    width, so that each column can hold 4 points of the
+    budget. In each column, only the first, the last, the
+    lowest and the highest point of a line are kept (M4
+    decimation), so the drawn line looks the same while
+    the output gets much smaller.
+
+    Only lines with monotonic x values and without markers
+    or step drawing are decimated. The lines are changed in
+    place.
+
+    Args:
+        budget: float | None: number of points per pixel
+                column a line may have. Lines with more
+                points are decimated. None disables
+                decimation.
+
+    Returns:
+        None
+    """
+    global points_per_pixel
+    points_per_pixel = budget
+
+def _m4_indices(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Returns the indices of the points of a line that are
+    kept by M4 decimation. x is monotonic and in units of
+    the column width. Points that are not finite are kept,
+    since they split the line into separate segments.
+    """
+    finite = np.isfinite(x) & np.isfinite(y)
+    points = np.flatnonzero(finite)
+    if len(points) == 0:
+        return np.arange(len(x))
+    columns = np.floor(x[points])
+    segments = np.cumsum(~finite)[points]
+    # Buckets are runs of points in the same
+    # column and in the same segment of the line
+    starts = np.flatnonzero(np.r_[True, (np.diff(columns) != 0)
+                                  | (np.diff(segments) != 0)])
+    ends = np.r_[starts[1:], len(points)] - 1
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(points)]))
+    values = y[points]
+    keep = [starts, ends]
+    for extremum in (np.minimum, np.maximum):
+        is_extremum = values == extremum.reduceat(values, starts)[bucket]
+        # The first extremum of each bucket
+        candidates = np.flatnonzero(is_extremum)
+        _, first = np.unique(bucket[candidates], return_index=True)
+        keep.append(candidates[first])
+    return np.union1d(points[np.concatenate(keep)], np.flatnonzero(~finite))
+
+def _decimate_line(line: Line2D, columns: float) -> int:
+    """
+    Decimate a line if it has more points than its budget.
+
+    Args:
+        line: Line2D: the line
+        columns: float: width of the axes in pixel columns
+
+    Returns:
+        int: number of removed points
+    """
+    xy = line.get_xydata()
+    if len(xy) <= points_per_pixel * columns:
+        return 0
+    if line.get_marker() not in (None, "None", "", " ") \
+            or line.get_drawstyle() != "default":
+        return 0
+    pixels = line.get_transform().transform(xy)
+    steps = np.diff(pixels[:, 0])
+    steps = steps[np.isfinite(steps)]
+    if not (np.all(steps >= 0) or np.all(steps <= 0)):
+        return 0
+    keep = _m4_indices(pixels[:, 0] * points_per_pixel / 4, pixels[:, 1])
+    if len(keep) == len(xy):
+        return 0
+    line.set_data(xy[keep, 0], xy[keep, 1])
+    return len(xy) - len(keep)
+
+def decimate(fig: Figure) -> int:
+    """
+    Decimate the lines of a figure if decimation is enabled
+    (see line_decimation).
+
+    Args:
+        fig: Figure: the figure
+
+    Returns:
+        int: number of removed points
+    """
+    global removed
+    if points_per_pixel is None:
+        return 0
+    count = 0
+    for ax in fig.axes:
+        # Update the pending autoscaling of the view limits
+        # and the aspect, which the pixel positions depend on
+        ax.get_xlim()
+        ax.get_ylim()
+        ax.apply_aspect()
+        columns = ax.get_window_extent().width
+        for line in ax.get_lines():
+            count += _decimate_line(line, columns)
+    removed += count
+    return count
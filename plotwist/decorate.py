@@ -3,9 +3,13 @@ Functions for regular reoccuring configurations of matplotlib axes.
 """
 from typing import *
 import matplotlib.pyplot as plt
-from matplotlib.ticker import FuncFormatter
+from matplotlib.ticker import Formatter
 from matplotlib.axes import Axes
 import numpy as np
+from . import _use_style
+
+# Use the style of plotwist for all plots
+_use_style()
 
 def format_large_numbers(range_: Tuple, x: float, pos: int) -> str:
     """
@@ -71,6 +75,16 @@ def format_large_numbers(range_: Tuple, x: float, pos: int) -> str:
             return f'{x:.1f}'
         return f'{x:.3f}'
 
+class LargeNumberFormatter(Formatter):
+    """
+    Tick formatter that formats large numbers in a human-readable
+    way (see format_large_numbers), relative to the view limits
+    of its axis. Unlike a lambda, it can be pickled, so decorated
+    figures can be rendered in the background.
+    """
+    def __call__(self, x: float, pos: int | None = None) -> str:
+        return format_large_numbers(tuple(self.axis.get_view_interval()), x, pos)
+
 def decorate(ax: Axes | None = None, tick_label_offset: float = 0):
     """
     Decorate an axes with a grid and set the aspect ratio to be equal.
@@ -78,12 +92,8 @@ def decorate(ax: Axes | None = None, tick_label_offset: float = 0):
     ax = ax or plt.gca()
     ax.grid(True)
     ax.legend()
-    ax.get_xaxis().set_major_formatter(
-        lambda x, pos: format_large_numbers(ax.get_xlim(), x, pos)
-    )
-    ax.get_yaxis().set_major_formatter(
-        lambda x, pos: format_large_numbers(ax.get_ylim(), x, pos)
-    )
+    ax.get_xaxis().set_major_formatter(LargeNumberFormatter())
+    ax.get_yaxis().set_major_formatter(LargeNumberFormatter())
 
 C = ['#003049', '#d62828', '#f77f00', '#fcbf49', '#588157', '#3a5a40']
 
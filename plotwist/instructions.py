@@ -19,7 +19,7 @@ def title(title: str) -> None:
         None
     """
     # Make the HTML
-    item = Item(f"<h1>{title}</h1>", mode="block")
+    item = Item(f"<h1>{title}</h1>", mode="block", section=(1, title))
     # Append the item to the program
     ptp.program.append(item)
 
@@ -34,7 +34,7 @@ def subtitle(subtitle: str) -> None:
         None
     """
     # Make the HTML
-    item = Item(f"<h2>{subtitle}</h2>", mode="block")
+    item = Item(f"<h2>{subtitle}</h2>", mode="block", section=(2, subtitle))
     # Append the item to the program
     ptp.program.append(item)
 
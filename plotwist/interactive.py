@@ -0,0 +1,220 @@
+"""
+Lightweight interactive figures that are drawn in the browser
+by the shared plotwist.js runtime
+"""
+# Imports
+import os
+import json
+import base64
+import shutil
+import warnings
+from typing import Any, Dict, List
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.axes import Axes
+from matplotlib.colors import to_hex
+from matplotlib.collections import PathCollection
+from matplotlib.patches import Rectangle
+
+#############
+# Constants #
+#############
+
+# The runtime that draws the figures. It is copied once
+# into the plots directory of a report.
+RUNTIME = os.path.join(os.path.dirname(__file__), "plotwist.js")
+# Line styles that the runtime draws as dashes
+DASHES = {"-": [], "--": [6, 4], ":": [1, 3], "-.": [6, 3, 1, 3]}
+
+#############
+# Functions #
+#############
+
+def _encode(values: Any, dtype: str = "<f4") -> str:
+    """
+    Encode values as a base64 string of a little
+    endian buffer (float32 by default).
+    """
+    return base64.b64encode(
+        np.ascontiguousarray(values, dtype=dtype).tobytes()
+    ).decode()
+
+def _to_data(ax: Axes, artist: Any, xy: np.ndarray) -> np.ndarray:
+    """
+    Convert the points of an artist to data coordinates
+    of its axes, e.g. for lines of axhline().
+    """
+    transform = artist.get_transform()
+    if transform == ax.transData:
+        return xy
+    return ax.transData.inverted().transform(transform.transform(xy))
+
+def _scale(scale: str) -> str:
+    """
+    Returns the scale of an axis that the runtime draws.
+    Scales other than log are drawn linear.
+    """
+    return "log" if scale == "log" else "linear"
+
+def _line_spec(ax: Axes, line: Any, dpi: float) -> Dict[str, Any]:
+    """
+    Returns the spec of a Line2D.
+    """
+    xy = _to_data(ax, line, np.asarray(line.get_xydata(), dtype=float))
+    marker = line.get_marker()
+    return {
+        "x": _encode(xy[:, 0]),
+        "y": _encode(xy[:, 1]),
+        "color": to_hex(line.get_color(), keep_alpha=True),
+        "alpha": line.get_alpha(),
+        "width": line.get_linewidth() * dpi / 72,
+        "dashes": DASHES.get(line.get_linestyle()),
+        "marker": marker not in (None, "None", "", " "),
+        "markersize": line.get_markersize() * dpi / 72,
+        "label": line.get_label(),
+        "zorder": line.get_zorder(),
+    }
+
+def _scatter_spec(ax: Axes, collection: PathCollection, dpi: float) -> Dict[str, Any]:
+    """
+    Returns the spec of a scatter plot.
+    """
+    xy = _to_data(ax, collection, np.asarray(collection.get_offsets(), dtype=float))
+    colors = np.asarray(collection.get_facecolors())
+    sizes = np.asarray(collection.get_sizes(), dtype=float)
+    spec = {
+        "x": _encode(xy[:, 0]),
+        "y": _encode(xy[:, 1]),
+        # Marker areas are in points squared
+        "sizes": _encode(np.sqrt(sizes) * dpi / 72),
+        "label": collection.get_label(),
+        "zorder": collection.get_zorder(),
+    }
+    if len(colors) == 1:
+        spec["color"] = to_hex(colors[0], keep_alpha=True)
+    else:
+        spec["colors"] = _encode(np.round(colors * 255), dtype="u1")
+    return spec
+
+def _bar_spec(ax: Axes, patch: Rectangle) -> Dict[str, Any]:
+    """
+    Returns the spec of a rectangle in data coordinates.
+    """
+    corners = _to_data(ax, patch, patch.get_patch_transform().transform(
+        [[0, 0], [1, 1]]))
+    return {
+        "x": float(corners[0, 0]), "y": float(corners[0, 1]),
+        "width": float(corners[1, 0] - corners[0, 0]),
+        "height": float(corners[1, 1] - corners[0, 1]),
+        "color": to_hex(patch.get_facecolor(), keep_alpha=True),
+    }
+
+def _legend_spec(ax: Axes) -> List[Dict[str, Any]] | None:
+    """
+    Returns the entries of the legend of an axes.
+    """
+    legend = ax.get_legend()
+    if legend is None:
+        return None
+    entries = []
+    for handle, text in zip(legend.legend_handles, legend.get_texts()):
+        if hasattr(handle, "get_color") and not isinstance(handle, PathCollection):
+            color = handle.get_color()
+        else:
+            color = handle.get_facecolor()
+            if np.ndim(color) == 2:
+                color = color[0]
+        entries.append({"label": text.get_text(),
+                        "color": to_hex(color, keep_alpha=True)})
+    return entries
+
+def _axes_spec(ax: Axes, dpi: float) -> Dict[str, Any]:
+    """
+    Returns the spec of an axes and its artists.
+    """
+    spec = {
+        "bounds": ax.get_position().bounds,
+        "xlim": ax.get_xlim(),
+        "ylim": ax.get_ylim(),
+        "xscale": _scale(ax.get_xscale()),
+        "yscale": _scale(ax.get_yscale()),
+        "title": ax.get_title(),
+        "xlabel": ax.get_xlabel(),
+        "ylabel": ax.get_ylabel(),
+        "grid": any(line.get_visible() for line in ax.get_xgridlines()),
+        "facecolor": to_hex(ax.get_facecolor(), keep_alpha=True),
+        "lines": [_line_spec(ax, line, dpi)
+                  for line in ax.get_lines() if line.get_visible()],
+        "scatters": [],
+        "bars": [],
+        "legend": _legend_spec(ax),
+    }
+    unsupported = {type(artist).__name__ for artist in [*ax.images, *ax.texts]
+                   if artist.get_visible()}
+    for collection in ax.collections:
+        if not isinstance(collection, PathCollection):
+            unsupported.add(type(collection).__name__)
+        elif collection.get_visible():
+            spec["scatters"].append(_scatter_spec(ax, collection, dpi))
+    for patch in ax.patches:
+        if not isinstance(patch, Rectangle):
+            unsupported.add(type(patch).__name__)
+        elif patch.get_visible():
+            spec["bars"].append(_bar_spec(ax, patch))
+    if unsupported:
+        warnings.warn(f"Artists of type {', '.join(sorted(unsupported))} "
+                      f"are not drawn in lightweight interactive plots.")
+    return spec
+
+def figure_spec(fig: Figure) -> Dict[str, Any]:
+    """
+    Extract what the runtime draws from a figure: the
+    axes with their lines, scatter plots, bars and legends.
+    The data is stored as base64 encoded float32 buffers.
+
+    Args:
+        fig: Figure: the figure
+
+    Returns:
+        dict: the spec of the figure
+    """
+    width, height = fig.get_size_inches() * fig.dpi
+    return {
+        "width": float(width),
+        "height": float(height),
+        "fontsize": float(fig.dpi / 72 * 10),
+        "facecolor": to_hex(fig.get_facecolor(), keep_alpha=True),
+        "axes": [_axes_spec(ax, fig.dpi) for ax in fig.axes
+                 if ax.get_visible()],
+    }
+
+def save_js(fig: Figure, path: str) -> None:
+    """
+    Save a figure as a script that defines its spec for
+    the runtime. The runtime keys the spec by the source
+    of the script, so the file does not depend on its name
+    and can be served from the figure cache.
+
+    Args:
+        fig: Figure: the figure
+        path: str: the output path
+
+    Returns:
+        None
+    """
+    with open(path, "w") as file:
+        file.write(f"plotwist.define({json.dumps(figure_spec(fig))});\n")
+
+def copy_runtime(directory: str) -> None:
+    """
+    Copy the runtime into a directory, if it is not there yet.
+
+    Args:
+        directory: str: the directory
+
+    Returns:
+        None
+    """
+    target = os.path.join(directory, "plotwist.js")
+    if not os.path.exists(target):
+        shutil.copyfile(RUNTIME, target)
@@ -3,7 +3,11 @@ A submodule with lots of helper functions for nice logging
 """
 
 # Imports
-from time import time
+import os
+import json
+import threading
+from time import perf_counter_ns
+from typing import Any, Dict, List
 
 #############
 # Constants #
@@ -13,24 +17,99 @@ from time import time
 level_colors = ["\033[31m", "\033[32m", "\033[33m", "\033[34m", "\033[35m", "\033[36m"]
 # Reset color string
 reset_color = "\033[0m"
+# Percentiles in the statistics of the spans
+PERCENTILES = (50, 90, 99)
 
 ###########
 # Globals #
 ###########
 
-# Store how often the TimePrint class was entered
-level = 0
+# Spans that are open in the current thread. The
+# number of open spans is the level of the thread.
+_open = threading.local()
+# Whether spans are recorded
+recording = False
+# Recorded spans without parent by thread id
+spans: Dict[int, List["SpanRecord"]] = {}
+# Names of the threads that recorded spans
+thread_names: Dict[int, str] = {}
+# Lock for adding threads to the recorded spans
+_lock = threading.Lock()
 
 ###########
 # Classes #
 ###########
 
-class TimePrint:
+class SpanRecord:
     """
-    Nice printing 'function' (context manager)that also 
+    A recorded span: its label, its start and end in
+    nanoseconds (perf_counter_ns) and its child spans.
+    """
+    __slots__ = ("label", "start", "end", "children")
+
+    def __init__(self, label: str, start: int) -> None:
+        self.label = label
+        self.start = start
+        self.end: int | None = None
+        self.children: List[SpanRecord] = []
+
+def _stack() -> List[SpanRecord | None]:
+    """
+    Returns the open spans of the current thread. Spans
+    that are not recorded are None.
+    """
+    try:
+        return _open.stack
+    except AttributeError:
+        _open.stack = []
+        return _open.stack
+
+class Span:
+    """
+    Context manager that measures the time it takes to execute
+    the below code block. If recording is enabled (see
+    profiling), the span is recorded in a tree below the span
+    that is open in the same thread.
+    """
+    def __init__(self, label: str) -> None:
+        self.label = label
+
+    def __enter__(self) -> "Span":
+        stack = _stack()
+        self.level = len(stack)
+        self.record = None
+        if recording:
+            self.record = SpanRecord(self.label, 0)
+            parent = stack[-1] if stack else None
+            if parent is not None:
+                parent.children.append(self.record)
+            else:
+                thread = threading.get_ident()
+                if thread not in spans:
+                    with _lock:
+                        spans.setdefault(thread, [])
+                        thread_names[thread] = threading.current_thread().name
+                spans[thread].append(self.record)
+        stack.append(self.record)
+        # Start the timer
+        self.start = perf_counter_ns()
+        if self.record is not None:
+            self.record.start = self.start
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.end = perf_counter_ns()
+        if self.record is not None:
+            self.record.end = self.end
+        _stack().pop()
+
+class TimePrint(Span):
+    """
+    Nice printing 'function' (context manager)that also
     measures the time it takes to execute the below code block.
     """
     def __init__(self, message: str, nice=True) -> None:
+        super().__init__(message)
         # Save the message
         self.message = message
         # Add decorations
@@ -39,13 +118,12 @@ class TimePrint:
 
     def __enter__(self) -> None:
         # Get the current color
-        global level
+        level = len(_stack())
         self.color = level_colors[level % len(level_colors)]
         # Print the message
         print(" " * 4 * level + self.color + self.message + reset_color)
         # Start the timer
-        self.start = time()
-        level += 1
+        super().__enter__()
 
     def _unit_map(self, dt: float) -> str:
         """
@@ -64,9 +142,133 @@ class TimePrint:
         return f"{dt / 3600:.1f} h"
 
     def __exit__(self, *args):
+        super().__exit__(*args)
         # Print the time it took
-        dt = time() - self.start
+        dt = (self.end - self.start) / 1e9
         print(self.color + f"done ({self._unit_map(dt)})" + reset_color)
-        # Decrese the current level
-        global level
-        level -= 1
+
+#############
+# Functions #
+#############
+
+def profiling(enabled: bool = True) -> None:
+    """
+    Record the spans of TimePrint and Span blocks in a tree
+    for each thread, to find the sections of a script that
+    dominate its runtime (see print_profile and
+    export_chrome_trace).
+
+    Args:
+        enabled: bool: whether spans are recorded
+
+    Returns:
+        None
+    """
+    global recording
+    recording = enabled
+
+def reset_profile() -> None:
+    """
+    Delete the recorded spans.
+    """
+    with _lock:
+        spans.clear()
+        thread_names.clear()
+
+def _walk(records: List[SpanRecord]):
+    """
+    Yield the finished spans of a tree.
+    """
+    for record in records:
+        if record.end is not None:
+            yield record
+        yield from _walk(record.children)
+
+def _percentile(values: List[int], percentile: float) -> float:
+    """
+    Returns a percentile of sorted values, interpolated
+    linearly between the closest ranks.
+    """
+    position = (len(values) - 1) * percentile / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def profile_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Returns statistics of the recorded spans by label.
+
+    Returns:
+        dict: for each label the count, the total, the self
+              time (without child spans), the mean, the min,
+              the max and the percentiles (p50, p90, p99)
+              of the durations in seconds
+    """
+    durations: Dict[str, List[int]] = {}
+    self_times: Dict[str, int] = {}
+    for records in list(spans.values()):
+        for record in _walk(records):
+            duration = record.end - record.start
+            durations.setdefault(record.label, []).append(duration)
+            self_times[record.label] = self_times.get(record.label, 0) + duration \
+                - sum(child.end - child.start for child in record.children
+                      if child.end is not None)
+    stats = {}
+    for label, values in durations.items():
+        values.sort()
+        stats[label] = {
+            "count": len(values),
+            "total": sum(values) / 1e9,
+            "self": self_times[label] / 1e9,
+            "mean": sum(values) / len(values) / 1e9,
+            "min": values[0] / 1e9,
+            "max": values[-1] / 1e9,
+            **{f"p{percentile}": _percentile(values, percentile) / 1e9
+               for percentile in PERCENTILES},
+        }
+    return stats
+
+def print_profile() -> None:
+    """
+    Print the statistics of the recorded spans,
+    sorted by their total time.
+    """
+    stats = profile_stats()
+    width = max([len(label) for label in stats] + [5])
+    print(f"{'label':{width}} {'count':>7} {'total':>10} {'self':>10} "
+          f"{'mean':>10} " + " ".join(f"{f'p{p}':>10}" for p in PERCENTILES))
+    for label, stat in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+        print(f"{label:{width}} {stat['count']:7d} "
+              + " ".join(f"{stat[key]:10.4f}" for key in
+                         ["total", "self", "mean", *[f"p{p}" for p in PERCENTILES]]))
+
+def export_chrome_trace(path: str) -> None:
+    """
+    Write the recorded spans as Chrome trace events (JSON),
+    which can be opened in chrome://tracing or Perfetto.
+
+    Args:
+        path: str: the output path
+
+    Returns:
+        None
+    """
+    pid = os.getpid()
+    events: List[Dict[str, Any]] = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": thread,
+         "args": {"name": name}}
+        for thread, name in list(thread_names.items())
+    ]
+    for thread, records in list(spans.items()):
+        for record in _walk(records):
+            events.append({
+                "name": record.label,
+                "cat": "plotwist",
+                "ph": "X",
+                "ts": record.start / 1e3,
+                "dur": (record.end - record.start) / 1e3,
+                "pid": pid,
+                "tid": thread,
+            })
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
@@ -3,21 +3,415 @@ Invokable module that runs a report making script and pushes the report to a rem
 in regular intervals.
 """
 
+import os
+import sys
+import glob
+import json
+import time
+import runpy
+import shlex
+import shutil
+import hashlib
+import traceback
 import subprocess as sp
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Set, Tuple
 
-def make_and_push(script: str, report_name: str, scp_dest: str) -> None:
+##############
+# Transports #
+##############
+
+class Transport(ABC):
+    """
+    A class for transferring the files of a report
+    to a destination.
+    """
+    @abstractmethod
+    def put(self, source: str, paths: List[str]) -> None:
+        """
+        Copies files from the source directory to the
+        same relative paths at the destination.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, paths: List[str]) -> None:
+        """
+        Deletes files at the destination.
+        """
+        pass
+
+class ScpTransport(Transport):
+    """
+    A class for transferring files to a remote
+    server (user@host:/path/to/dest) with scp and ssh.
+    """
+    def __init__(self, dest: str):
+        self.host, self.path = dest.split(":", 1)
+
+    def _ssh(self, command: str) -> None:
+        """
+        Runs a command on the remote server.
+        """
+        sp.run(["ssh", self.host, command], check=True)
+
+    def put(self, source: str, paths: List[str]) -> None:
+        """
+        Copies files from the source directory to the
+        same relative paths at the destination.
+        """
+        # Group the files by directory, so that each
+        # directory is copied with one scp call
+        directories: Dict[str, List[str]] = {}
+        for path in paths:
+            directories.setdefault(os.path.dirname(path), []).append(path)
+        remote = {directory: os.path.join(self.path, directory)
+                  for directory in directories}
+        self._ssh("mkdir -p " + " ".join(shlex.quote(path)
+                                         for path in remote.values()))
+        for directory, files in directories.items():
+            sp.run(["scp", *[os.path.join(source, path) for path in files],
+                    f"{self.host}:{remote[directory]}/"], check=True)
+
+    def delete(self, paths: List[str]) -> None:
+        """
+        Deletes files at the destination.
+        """
+        if paths:
+            self._ssh("rm -f " + " ".join(shlex.quote(os.path.join(self.path, path))
+                                          for path in paths))
+
+class LocalTransport(Transport):
+    """
+    A class for transferring files to a local directory.
+    """
+    def __init__(self, dest: str):
+        self.path = dest
+
+    def put(self, source: str, paths: List[str]) -> None:
+        """
+        Copies files from the source directory to the
+        same relative paths at the destination.
+        """
+        for path in paths:
+            target = os.path.join(self.path, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(source, path), target)
+
+    def delete(self, paths: List[str]) -> None:
+        """
+        Deletes files at the destination.
+        """
+        for path in paths:
+            target = os.path.join(self.path, path)
+            if os.path.exists(target):
+                os.remove(target)
+
+def make_transport(dest: str) -> Transport:
+    """
+    Returns the transport for a destination: scp for
+    user@host:/path destinations, else a local copy.
+    """
+    if ":" in dest and not os.path.isabs(dest):
+        return ScpTransport(dest)
+    return LocalTransport(dest)
+
+##############
+# Delta Push #
+##############
+
+def file_hash(path: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a file.
+    """
+    hash_ = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(2**20), b""):
+            hash_.update(chunk)
+    return hash_.hexdigest()
+
+def _manifest_path(report_name: str) -> str:
+    """
+    Returns the path of the manifest of the last
+    successful push, which is kept next to the report.
+    """
+    report = os.path.normpath(report_name)
+    return os.path.join(os.path.dirname(report) or ".",
+                        f".{os.path.basename(report)}.pushed.json")
+
+def _scan(report_name: str, previous: Dict[str, list]) -> Dict[str, list]:
+    """
+    Returns the [size, mtime, hash] of all files of a report
+    by their path relative to the parent of the report, like
+    scp -r lays them out at the destination. Files whose size
+    and mtime did not change since the last push are not
+    hashed again.
+    """
+    parent = os.path.dirname(os.path.normpath(report_name)) or "."
+    files = {}
+    for root, _, names in os.walk(report_name, followlinks=True):
+        for name in names:
+            full = os.path.join(root, name)
+            path = os.path.relpath(full, parent)
+            stat = os.stat(full)
+            entry = previous.get(path)
+            if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+                entry = [stat.st_size, stat.st_mtime_ns, file_hash(full)]
+            files[path] = entry
+    return files
+
+def _upload_stages(paths: List[str]) -> List[List[str]]:
+    """
+    Split the paths (relative to the parent of the report)
+    into the assets, the html pages in the report directory
+    and the index page, in the order of uploading.
+    """
+    pages = [path for path in paths if path.endswith(".html")
+             and os.path.dirname(os.path.dirname(path)) == ""]
+    index = [path for path in pages if os.path.basename(path) == "index.html"]
+    return [[path for path in paths if path not in pages],
+            [path for path in pages if path not in index],
+            index]
+
+def delta_push(report_name: str, dest: str,
+               transport: Transport | None = None) -> Dict[str, float]:
+    """
+    Pushes only the files of a report that are new or changed
+    since the last successful push to the destination, and
+    deletes the files that were removed. The content hashes
+    of the pushed files are kept in a manifest next to the
+    report, which is only updated when the push succeeds.
+
+    Args:
+        report_name: str: the report directory
+        dest: str: the destination, e.g. user@host:/path/to/dest
+        transport: Transport | None: the transport to the
+                   destination. Defaults to make_transport(dest).
+
+    Returns:
+        dict: stats of the push: files and bytes that were
+              pushed, files that were deleted and unchanged,
+              and seconds it took
+    """
+    start = time.perf_counter()
+    if transport is None:
+        transport = make_transport(dest)
+    manifest = _manifest_path(report_name)
+    previous: Dict[str, list] = {}
+    if os.path.exists(manifest):
+        with open(manifest) as file:
+            pushed = json.load(file)
+        # A push to another destination starts over
+        if pushed["dest"] == dest:
+            previous = pushed["files"]
+    files = _scan(report_name, previous)
+    changed = sorted(path for path, entry in files.items()
+                     if path not in previous or previous[path][2] != entry[2])
+    deleted = sorted(path for path in previous if path not in files)
+    # Upload the plots and other assets before the pages that
+    # use them and the index last, so that a reader never loads
+    # a page whose plots are missing. Delete files afterwards.
+    source = os.path.dirname(os.path.normpath(report_name)) or "."
+    for stage in _upload_stages(changed):
+        if stage:
+            transport.put(source, stage)
+    transport.delete(deleted)
+    with open(manifest + ".tmp", "w") as file:
+        json.dump({"dest": dest, "files": files}, file)
+    os.replace(manifest + ".tmp", manifest)
+    return {
+        "files": len(changed),
+        "bytes": sum(files[path][0] for path in changed),
+        "deleted": len(deleted),
+        "unchanged": len(files) - len(changed),
+        "seconds": time.perf_counter() - start,
+    }
+
+def push(report_name: str, scp_dest: str, delta: bool = False) -> None:
+    """
+    Pushes the report to a remote server. With delta, only
+    the changed files are pushed (see delta_push).
+    """
+    print("Pushing report...")
+    if delta:
+        stats = delta_push(report_name, scp_dest)
+        print(f"Pushed {stats['files']} files ({stats['bytes']} bytes), "
+              f"deleted {stats['deleted']}, {stats['unchanged']} unchanged "
+              f"in {stats['seconds']:.1f}s")
+    else:
+        sp.run(['scp', '-r', report_name, scp_dest])
+    print("done")
+
+def make_and_push(script: str, report_name: str, scp_dest: str,
+                  delta: bool = False) -> None:
     """
     Runs a report making script and pushes the report to a remote server.
+    With delta, only the changed files are pushed (see delta_push).
     """
     print(f"Running {script}...")
     sp.run(['python', script])
-    print("Pushing report...")
-    sp.run(['scp', '-r', report_name, scp_dest])
-    print("done")
+    push(report_name, scp_dest, delta)
+
+#########
+# Watch #
+#########
+
+# Flags of os.open() that open a file for writing
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND
+
+def _recorder(inputs: Set[str], outputs: Set[str]) -> Callable:
+    """
+    Returns an audit hook that records the files a script reads
+    and writes, and the directories it lists (e.g. with glob).
+    """
+    def hook(event: str, args: tuple) -> None:
+        if event == "open":
+            path, mode, flags = args
+            if not isinstance(path, str):
+                return
+            if mode is None:
+                writes = bool(flags & WRITE_FLAGS)
+            else:
+                writes = any(char in mode for char in "wax+")
+            (outputs if writes else inputs).add(os.path.abspath(path))
+        elif event in ("os.listdir", "os.scandir") and isinstance(args[0], str):
+            inputs.add(os.path.abspath(args[0]))
+    return hook
+
+def _library_dirs() -> Tuple[str, ...]:
+    """
+    Returns the directories of Python, the installed packages
+    and the matplotlib caches, whose files are not inputs.
+    """
+    import site
+    import matplotlib
+    return tuple(os.path.join(os.path.abspath(path), "") for path in (
+        sys.prefix, sys.base_prefix, site.getusersitepackages(),
+        os.path.dirname(__file__), matplotlib.get_configdir(),
+        matplotlib.get_cachedir(), "/dev", "/proc", "/sys",
+    ))
+
+def run_warm(script: str) -> Tuple[bool, List[str]]:
+    """
+    Runs a script in a fork of this process, which already
+    has numpy, matplotlib and plotwist imported, so the script
+    only pays for its own runtime. Each run starts from the
+    same clean state, since the fork is discarded afterwards.
+
+    Args:
+        script: str: path of the script
+
+    Returns:
+        bool: whether the script succeeded
+        list: files and directories the script read and
+              did not write itself
+    """
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        inputs: Set[str] = set()
+        outputs: Set[str] = set()
+        status = 0
+        try:
+            sys.argv = [script]
+            sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+            sys.addaudithook(_recorder(inputs, outputs))
+            runpy.run_path(script, run_name="__main__")
+        except SystemExit as error:
+            status = 0 if error.code in (None, 0) else 1
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            with os.fdopen(write, "w") as file:
+                json.dump(sorted(inputs - outputs), file)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+    os.close(write)
+    with os.fdopen(read) as file:
+        inputs = json.loads(file.read() or "[]")
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status) == 0, inputs
+
+def _signature(paths: Set[str]) -> Dict[str, Tuple[int, int] | None]:
+    """
+    Returns the (mtime, size) of files and directories.
+    A directory changes when files are added or removed.
+    """
+    signature = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature[path] = None
+    return signature
+
+def _expand(paths: Set[str], patterns: List[str]) -> Set[str]:
+    """
+    Returns the paths and the files matching the glob patterns.
+    """
+    expanded = set(paths)
+    for pattern in patterns:
+        expanded.update(os.path.abspath(path) for path in glob.glob(pattern))
+    return expanded
+
+def watch(script: str, report_name: str, scp_dest: str, delta: bool = False,
+          patterns: List[str] = (), poll: float = 1.0) -> None:
+    """
+    Rebuilds and pushes the report whenever the script or its
+    inputs change. The script runs in a warm fork of this process
+    (see run_warm). Its inputs are the files it read in the last
+    run, e.g. SSPE logs, the directories it listed, and the files
+    matching the glob patterns. Files read by worker processes of
+    the script are not recorded, so they need a pattern. Between
+    changes, only the modification times are checked.
+
+    Args:
+        script: str: path of the script
+        report_name: str: the report directory
+        scp_dest: str: the destination
+        delta: bool: only push the changed files
+        patterns: List[str]: glob patterns of further inputs
+        poll: float: seconds between checks for changes
+
+    Returns:
+        None
+    """
+    # Import the heavy modules once for all runs
+    import numpy
+    import matplotlib.pyplot
+    import plotwist.plot
+    import plotwist.decorate
+    import plotwist.data_handling
+    excluded = _library_dirs()
+    outputs = tuple(os.path.join(os.path.abspath(path), "")
+                    for path in (report_name, "tmp"))
+    inputs: Set[str] = set()
+    while True:
+        print(f"Running {script}...")
+        start = time.perf_counter()
+        succeeded, read = run_warm(script)
+        print(f"Ran {script} in {time.perf_counter() - start:.1f}s")
+        if succeeded:
+            try:
+                push(report_name, scp_dest, delta)
+            except sp.CalledProcessError as error:
+                print(f"Push failed: {error}")
+        # Keep the inputs of the last run if it failed early
+        if read or succeeded:
+            inputs = {path for path in read
+                      if not path.startswith(excluded + outputs)}
+        watched = inputs | {os.path.abspath(script)}
+        signature = _signature(_expand(watched, patterns))
+        print("Waiting for changes...")
+        while _signature(_expand(watched, patterns)) == signature:
+            time.sleep(poll)
 
 if __name__ == '__main__':
     import argparse
-    import time
     import tqdm
     parser = argparse.ArgumentParser()
     parser.add_argument(type=str,
@@ -28,7 +422,7 @@ if __name__ == '__main__':
                         dest='report_name',
                         default='report'
                         )
-    parser.add_argument(type=str, 
+    parser.add_argument(type=str,
                         help='scp destination e.g. (user@host:/path/to/dest)',
                         dest='scp'
                         )
@@ -36,13 +430,31 @@ if __name__ == '__main__':
                         type=int,
                         default=60,
                         help='push interval in seconds')
+    parser.add_argument('--delta',
+                        action='store_true',
+                        help='only push new and changed files')
+    parser.add_argument('--watch',
+                        action='store_true',
+                        help='rebuild in a warm worker when the script '
+                             'or its inputs change')
+    parser.add_argument('--inputs',
+                        type=str,
+                        nargs='*',
+                        default=[],
+                        help='glob patterns of further inputs to watch')
+    parser.add_argument('--poll',
+                        type=float,
+                        default=1.0,
+                        help='seconds between checks for changes')
     args = parser.parse_args()
+    if args.watch:
+        watch(args.script, args.report_name, args.scp, args.delta,
+              args.inputs, args.poll)
     while True:
-        make_and_push(args.script, args.report_name, args.scp)
+        try:
+            make_and_push(args.script, args.report_name, args.scp, args.delta)
+        except sp.CalledProcessError as error:
+            print(f"Push failed: {error}")
         print("Waiting...")
         for _ in tqdm.tqdm(range(args.interval)):
             time.sleep(1)
-
-    
-
-
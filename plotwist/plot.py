@@ -5,20 +5,45 @@ Plotting functions
 # Globals
 current_color = 0
 plot_idx = 0
+# Figures with more artists or more vertices than these
+# are written as raster images in the "auto" format
+auto_max_artists = 2000
+auto_max_vertices = 200_000
+# Extensions of the plots of the interactive embeddings
+interactive_extensions = {
+    "interactive": "html",
+    "lightweight": "js",
+}
+# Media types of the plots in packed sliders
+mime_types = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+    "webp": "image/webp",
+}
 
 # Typing
-from typing import List, Tuple, Literal
+from typing import Generator, List, Tuple, Literal
 
 # Imports 
 import os
+import json
+import base64
 import numpy as np
+import matplotlib as mpl
 from matplotlib.figure import Figure
 from matplotlib.axes import Axes
+from matplotlib.lines import Line2D
+from matplotlib.collections import Collection
 import matplotlib.pyplot as plt
 from .program import Item
+from .render import render, defer
+from .interactive import copy_runtime
 import plotwist as ptw 
 import plotwist.program as ptp
 
+# Use the style of plotwist for all plots
+ptw._use_style()
+
 # Make a temporary directory
 def make_tmp_dir() -> None:
     """
@@ -29,17 +54,61 @@ def make_tmp_dir() -> None:
     if not os.path.exists("tmp/plots"):
         os.makedirs("tmp/plots", exist_ok=True)
 
+# Select the output format of figures
+def _vertex_count(fig: Figure) -> Tuple[int, int]:
+    """
+    Returns the number of artists and the
+    number of vertices of a figure.
+    """
+    artists = fig.findobj()
+    vertices = 0
+    for artist in artists:
+        if isinstance(artist, Line2D):
+            vertices += len(artist.get_xydata())
+        elif isinstance(artist, Collection):
+            vertices += max(len(artist.get_offsets()), 1) * \
+                sum(len(path.vertices) for path in artist.get_paths())
+    return len(artists), vertices
+
+def output_format(figs: List[Figure], 
+                  format: Literal["svg", "png", "webp", "auto"] = "svg") -> str:
+    """
+    Returns the file extension for figures written in a format.
+    
+    Args:
+        figs: List[Figure]: the figures that are written together
+        format: str: "svg", "png", "webp" or "auto". "auto" selects
+                "png" if one of the figures has more artists than 
+                auto_max_artists or more vertices than 
+                auto_max_vertices and "svg" otherwise.
+    """
+    if format not in ("svg", "png", "webp", "auto"):
+        raise ValueError(f"Unknown format '{format}'.")
+    if format != "auto":
+        return format
+    for fig in figs:
+        artists, vertices = _vertex_count(fig)
+        if artists > auto_max_artists or vertices > auto_max_vertices:
+            return "png"
+    return "svg"
+
 # Add a plot to the html report
-def add_fig() -> None:
+def add_fig(format: Literal["svg", "png", "webp", "auto"] = "svg") -> None:
     """
     Add the current figure to the html report.
+
+    Args:
+        format: str: output format. Either "svg", "png", "webp"
+                or "auto" (see output_format).
     """
     global plot_idx
     make_tmp_dir()
-    plt.savefig(f"tmp/plots/plot_{plot_idx}.svg")
+    ext = output_format([plt.gcf()], format)
+    render(plt.gcf(), f"tmp/plots/plot_{plot_idx}.{ext}")
     ptp.program.append(
         Item(
-            f"<img src='plots/plot_{plot_idx}.svg'>"
+            f"<img src='plots/plot_{plot_idx}.{ext}'>",
+            size=_item_size(plt.gcf(), "plain", ext)
         )
     )
     plot_idx += 1
@@ -52,17 +121,24 @@ class embedded_subplots:
     """
     def __init__(self, 
                  *args, 
-                 embedding: Literal["plain", "scrollable", "interactive"] = "plain", 
+                 embedding: Literal["plain", "scrollable", "interactive", "lightweight"] = "plain", 
+                 format: Literal["svg", "png", "webp", "auto"] = "svg",
                  **kwargs) -> None:
         """
         Initialize the embedded_subplots context manager.
         
         Args:
             *args: tuple: arguments for plt.subplots
-            embedding: str: embedding type. Either "plain", "scrollable" or "interactive".
+            embedding: str: embedding type. Either "plain", "scrollable", "interactive"
+                       or "lightweight". "lightweight" is an interactive embedding
+                       that stores only the data of the plot and draws it with a
+                       runtime shared by all plots (see interactive.py).
+            format: str: output format of the "plain" and "scrollable" embeddings.
+                    Either "svg", "png", "webp" or "auto" (see output_format).
             **kwargs: dict: keyword arguments for plt.subplots
         """
         self.embedding = embedding
+        self.format = format
         self.fig, self.axs = plt.subplots(*args, **kwargs)
 
     def __enter__(self) -> Tuple[Figure, Axes]:
@@ -72,25 +148,40 @@ class embedded_subplots:
         global plot_idx
         make_tmp_dir()
         if self.embedding == "plain":
-            self.fig.savefig(f"tmp/plots/plot_{plot_idx}.svg")
+            ext = output_format([self.fig], self.format)
+            render(self.fig, f"tmp/plots/plot_{plot_idx}.{ext}")
             ptp.program.append(
                 Item(
-                    f"<img src='plots/plot_{plot_idx}.svg'>"
+                    f"<img src='plots/plot_{plot_idx}.{ext}'>",
+                    size=_item_size(self.fig, self.embedding, ext)
                 )
             )
         elif self.embedding == "scrollable":
-            self.fig.savefig(f"tmp/plots/plot_{plot_idx}.svg")
+            ext = output_format([self.fig], self.format)
+            render(self.fig, f"tmp/plots/plot_{plot_idx}.{ext}")
             ptp.program.append(
                 Item(
-                    f"<iframe src='plots/plot_{plot_idx}.svg' width='700px' height='500px'></iframe>"
+                    f"<iframe src='plots/plot_{plot_idx}.{ext}' width='700px' height='500px'></iframe>",
+                    size=_item_size(self.fig, self.embedding, ext)
                 )
             )
         elif self.embedding == "interactive":
-            import mpld3
-            mpld3.save_html(self.fig, f"tmp/plots/plot_{plot_idx}.html")
+            render(self.fig, f"tmp/plots/plot_{plot_idx}.html")
+            ptp.program.append(
+                Item(
+                    f"<iframe src='plots/plot_{plot_idx}.html' width='700px' height='500px'></iframe>",
+                    size=_item_size(self.fig, self.embedding, "html")
+                )
+            )
+        elif self.embedding == "lightweight":
+            copy_runtime("tmp/plots")
+            render(self.fig, f"tmp/plots/plot_{plot_idx}.js")
             ptp.program.append(
                 Item(
-                    f"<iframe src='plots/plot_{plot_idx}.html' width='700px' height='500px'></iframe>"
+                    f"<div id='plot_{plot_idx}' style='display: inline-block;'></div>",
+                    script=f'plotwist.show("plot_{plot_idx}", "plots/plot_{plot_idx}.js");',
+                    assets=["plots/plotwist.js"],
+                    size=_item_size(self.fig, self.embedding, "js")
                 )
             )
         plot_idx += 1
@@ -100,17 +191,31 @@ class slider_subplots:
     """
     Context manager type instruction that embeds a subplot with a slider    
     """
-    def __init__(self, n_plots: int, *args, embedding="plain", **kwargs) -> None:
+    def __init__(self, n_plots: int, *args, embedding="plain", format="svg", 
+                 packed=False, preload=True, **kwargs) -> None:
         """
         Initialize the slider_subplots context manager.
         
         Args:
             n_plots: int: number of plots
             *args: tuple: arguments for plt.subplots
-            embedding: str: embedding type. Either "plain", "scrollable" or "interactive".
+            embedding: str: embedding type. Either "plain", "scrollable", "interactive"
+                       or "lightweight" (see embedded_subplots).
+            format: str: output format of the "plain" and "scrollable" embeddings.
+                    Either "svg", "png", "webp" or "auto" (see output_format).
+                    All plots of the slider are written in the same format.
+            packed: bool: store all plots in one bundle file that the browser
+                    loads with a single request (see _pack_slider). Not
+                    supported for the interactive embeddings.
+            preload: bool: decode the plots of a packed slider one after 
+                     another once the bundle is loaded.
             **kwargs: dict: keyword arguments for plt.subplots
         """
+        _check_packed(embedding, packed)
         self.embedding = embedding
+        self.format = format
+        self.packed = packed
+        self.preload = preload
         self.figs = []
         self.axs = []
         for i in range(n_plots):
@@ -125,28 +230,178 @@ class slider_subplots:
     def __exit__(self, *args) -> None:
         global plot_idx
         make_tmp_dir()
+        if self.embedding in interactive_extensions:
+            ext = interactive_extensions[self.embedding]
+        else:
+            ext = output_format(self.figs, self.format)
         for fig in self.figs:
-            if self.embedding == "interactive":
-                import mpld3
-                mpld3.save_html(fig, f"tmp/plots/plot_{plot_idx}.html")
-            else:
-                fig.savefig(f"tmp/plots/plot_{plot_idx}.svg")
+            render(fig, f"tmp/plots/plot_{plot_idx}.{ext}")
             plot_idx += 1
+        ptp.program.append(
+            _slider_item(plot_idx - len(self.figs), len(self.figs),
+                         plot_idx, self.embedding, ext, 
+                         self.packed, self.preload,
+                         _item_size(self.figs[0], self.embedding, ext))
+        )
+        plot_idx += 1
+        for fig in self.figs:
+            plt.close(fig)
+
+def slider_frames(n_plots: int, *args, embedding="plain", format="svg", 
+                  packed=False, preload=True,
+                  **kwargs) -> Generator[Tuple[Figure, Axes], None, None]:
+    """
+    Generator type instruction that embeds subplots with a slider.
+    It yields the figure and axes of one plot at a time. A plot is
+    rendered and closed as soon as the next one is requested, so
+    only one figure is kept in memory. The slider is added to the
+    report when the generator is exhausted.
+
+    Args:
+        n_plots: int: number of plots
+        *args: tuple: arguments for plt.subplots
+        embedding: str: embedding type. Either "plain", "scrollable", "interactive"
+                   or "lightweight" (see embedded_subplots).
+        format: str: output format of the "plain" and "scrollable" embeddings.
+                Either "svg", "png", "webp" or "auto" (see output_format).
+                In "auto" mode the first plot selects the format of all plots.
+        packed: bool: store all plots in one bundle file (see slider_subplots).
+        preload: bool: decode the plots of a packed slider in advance.
+        **kwargs: dict: keyword arguments for plt.subplots
+
+    Yields:
+        Tuple[Figure, Axes]: the figure and axes of a plot
+    """
+    global plot_idx
+    _check_packed(embedding, packed)
+    make_tmp_dir()
+    # Reserve the indices of the plots and the slider, so
+    # that figures added between the frames do not collide
+    first_idx = plot_idx
+    slider_idx = plot_idx + n_plots
+    plot_idx += n_plots + 1
+    ext = interactive_extensions.get(embedding)
+    size = None
+    for i in range(n_plots):
+        fig, ax = plt.subplots(*args, **kwargs)
+        try:
+            yield fig, ax
+            if ext is None:
+                ext = output_format([fig], format)
+            if size is None:
+                size = _item_size(fig, embedding, ext)
+            render(fig, f"tmp/plots/plot_{first_idx + i}.{ext}")
+        finally:
+            plt.close(fig)
+    ptp.program.append(
+        _slider_item(first_idx, n_plots, slider_idx, embedding, ext,
+                     packed, preload, size)
+    )
+
+def _item_size(fig: Figure, embedding: str, ext: str) -> Tuple[float, float]:
+    """
+    Returns the size (width, height) in css pixels
+    with which a figure is shown in the report.
+    """
+    if embedding in ("scrollable", "interactive"):
+        return 700, 500
+    width, height = fig.get_size_inches()
+    if ext == "svg":
+        # SVG sizes are in points, which are 4/3 css pixels
+        dpi = 96
+    elif ext == "js" or mpl.rcParams["savefig.dpi"] == "figure":
+        dpi = fig.dpi
+    else:
+        dpi = mpl.rcParams["savefig.dpi"]
+    return width * dpi, height * dpi
+
+def _check_packed(embedding: str, packed: bool) -> None:
+    """
+    Raise an error if a slider can not be packed.
+    """
+    if packed and embedding in interactive_extensions:
+        raise ValueError("Packed sliders do not support "
+                         "the interactive embeddings.")
+
+def _pack_slider(paths: List[str], bundle: str, key: str, ext: str) -> None:
+    """
+    Write the plots of a slider as data URLs into one script
+    that registers them in window.plotwist_frames[key], and
+    remove the plot files except for the first one, which is 
+    shown until the bundle is loaded.
+    """
+    frames = []
+    for path in paths:
+        with open(path, "rb") as file:
+            frames.append(f"data:{mime_types[ext]};base64,"
+                          + base64.b64encode(file.read()).decode())
+    with open(bundle, "w") as file:
+        file.write("(window.plotwist_frames = window.plotwist_frames || {})"
+                   f"[{json.dumps(key)}] = {json.dumps(frames)};\n")
+    for path in paths[1:]:
+        os.remove(path)
+
+def _slider_item(first_idx: int, n_plots: int, slider_idx: int,
+                 embedding: str, ext: str, packed: bool = False,
+                 preload: bool = False, 
+                 size: Tuple[float, float] | None = None) -> Item:
+    """
+    Make the item of a slider that shows the plots
+    plot_{first_idx} to plot_{first_idx + n_plots - 1}.
+    Packed sliders are packed once the plots are rendered.
+    """
+    if embedding == "lightweight":
+        copy_runtime("tmp/plots")
         slider_plot_html = \
         f"""<span style="display: inline-flex; flex-direction: column;">
-<input type="range" min="0" max="{len(self.figs) - 1}" value="0" class="slider" id="slider_{plot_idx}">
-<{"img" if self.embedding == "plain" else "iframe"} src="plots/plot_{plot_idx - len(self.figs)}.{"html" if self.embedding == "interactive" else "svg"}" id="plot_{plot_idx}" {"width='700px' height='500px'" if not self.embedding == "plain" else ""}>{"</iframe>" if not self.embedding == "plain" else ""}
+<input type="range" min="0" max="{n_plots - 1}" value="0" class="slider" id="slider_{slider_idx}">
+<div id="plot_{slider_idx}"></div>
 </span>"""
         script = \
-f"""var slider_{plot_idx} = document.getElementById("slider_{plot_idx}");
-var output_{plot_idx} = document.getElementById("plot_{plot_idx}");
-slider_{plot_idx}.oninput = function() {{
-    output_{plot_idx}.src = "plots/plot_" + ({plot_idx - len(self.figs)} + parseInt(this.value)) + ".{'html' if self.embedding == 'interactive' else 'svg'}";
+f"""plotwist.show("plot_{slider_idx}", "plots/plot_{first_idx}.js");
+document.getElementById("slider_{slider_idx}").oninput = function() {{
+    plotwist.show("plot_{slider_idx}", "plots/plot_" + ({first_idx} + parseInt(this.value)) + ".js");
 }}"""
-
-        ptp.program.append(
-            Item(slider_plot_html, script=script)
-        )
-        plot_idx += 1
-        for fig in self.figs:
-            fig.clf()
+        return Item(slider_plot_html, script=script, assets=["plots/plotwist.js"],
+                    size=size)
+    slider_plot_html = \
+    f"""<span style="display: inline-flex; flex-direction: column;">
+<input type="range" min="0" max="{n_plots - 1}" value="0" class="slider" id="slider_{slider_idx}">
+<{"img" if embedding == "plain" else "iframe"} src="plots/plot_{first_idx}.{ext}" id="plot_{slider_idx}" {"width='700px' height='500px'" if not embedding == "plain" else ""}>{"</iframe>" if not embedding == "plain" else ""}
+</span>"""
+    script = \
+f"""var slider_{slider_idx} = document.getElementById("slider_{slider_idx}");
+var output_{slider_idx} = document.getElementById("plot_{slider_idx}");
+slider_{slider_idx}.oninput = function() {{
+    output_{slider_idx}.src = "plots/plot_" + ({first_idx} + parseInt(this.value)) + ".{ext}";
+}}"""
+    if packed:
+        defer(_pack_slider,
+              [f"tmp/plots/plot_{first_idx + i}.{ext}" for i in range(n_plots)],
+              f"tmp/plots/slider_{slider_idx}.js", f"slider_{slider_idx}", ext)
+        # The slider is enabled when the bundle is loaded
+        script = \
+f"""var slider_{slider_idx} = document.getElementById("slider_{slider_idx}");
+var output_{slider_idx} = document.getElementById("plot_{slider_idx}");
+var frames_{slider_idx} = [];
+var images_{slider_idx} = [];
+slider_{slider_idx}.disabled = true;
+var bundle_{slider_idx} = document.createElement("script");
+bundle_{slider_idx}.src = "plots/slider_{slider_idx}.js";
+bundle_{slider_idx}.onload = function() {{
+    frames_{slider_idx} = window.plotwist_frames["slider_{slider_idx}"];
+    slider_{slider_idx}.disabled = false;
+    var preload = function(idx) {{
+        if (!{json.dumps(preload)} || idx >= frames_{slider_idx}.length) return;
+        var image = new Image();
+        image.src = frames_{slider_idx}[idx];
+        images_{slider_idx}.push(image);
+        image.decode().catch(function() {{}}).then(function() {{ preload(idx + 1); }});
+    }};
+    preload(1);
+}};
+document.body.appendChild(bundle_{slider_idx});
+slider_{slider_idx}.oninput = function() {{
+    output_{slider_idx}.src = frames_{slider_idx}[parseInt(this.value)];
+}}"""
+    return Item(slider_plot_html, script=script, size=size)
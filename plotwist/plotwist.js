@@ -0,0 +1,461 @@
+/*
+ * Runtime of the lightweight interactive plots of PloTwist.
+ *
+ * A plot file calls plotwist.define(spec) with the spec of a figure
+ * (see plotwist/interactive.py) and plotwist.show(id, src) draws it
+ * on a canvas in the element with the id. The axes can be zoomed with
+ * the mouse wheel, panned by dragging and reset by double clicking.
+ * Hovering shows the coordinates of the nearest data point.
+ *
+ * In the lazy mode of the report (window.plotwist_lazy), plots are
+ * only loaded and drawn when they come close to the viewport.
+ */
+(function() {
+    "use strict";
+
+    // Specs keyed by the source of their plot file
+    var specs = {};
+    // Callbacks waiting for plot files that are loading
+    var waiting = {};
+    // Observer of the plots that wait to become visible in lazy mode
+    var observer = null;
+
+    /////////////
+    // Loading //
+    /////////////
+
+    function define(spec) {
+        specs[document.currentScript.getAttribute("src")] = spec;
+    }
+
+    function load(src, callback) {
+        if (specs[src]) {
+            callback(specs[src]);
+            return;
+        }
+        if (waiting[src]) {
+            waiting[src].push(callback);
+            return;
+        }
+        waiting[src] = [callback];
+        var script = document.createElement("script");
+        script.src = src;
+        script.onload = function() {
+            var callbacks = waiting[src];
+            delete waiting[src];
+            callbacks.forEach(function(callback) { callback(specs[src]); });
+        };
+        document.body.appendChild(script);
+    }
+
+    function decode(data, Type) {
+        var bytes = atob(data);
+        var buffer = new Uint8Array(bytes.length);
+        for (var i = 0; i < bytes.length; i++) {
+            buffer[i] = bytes.charCodeAt(i);
+        }
+        return new (Type || Float32Array)(buffer.buffer);
+    }
+
+    // Decode the buffers of a spec once
+    function prepare(spec) {
+        if (spec.prepared) return spec;
+        spec.axes.forEach(function(axes) {
+            axes.lines.concat(axes.scatters).forEach(function(artist) {
+                artist.x = decode(artist.x);
+                artist.y = decode(artist.y);
+                if (artist.sizes) artist.sizes = decode(artist.sizes);
+                if (artist.colors) artist.colors = decode(artist.colors, Uint8Array);
+            });
+        });
+        spec.prepared = true;
+        return spec;
+    }
+
+    ////////////
+    // Scales //
+    ////////////
+
+    function forward(scale, value) {
+        return scale === "log" ? Math.log10(value) : value;
+    }
+
+    function backward(scale, value) {
+        return scale === "log" ? Math.pow(10, value) : value;
+    }
+
+    function initialView(axes) {
+        return {
+            x0: forward(axes.xscale, axes.xlim[0]),
+            x1: forward(axes.xscale, axes.xlim[1]),
+            y0: forward(axes.yscale, axes.ylim[0]),
+            y1: forward(axes.yscale, axes.ylim[1])
+        };
+    }
+
+    // Rectangle of an axes in css pixels
+    function rectangle(spec, axes) {
+        var b = axes.bounds;
+        return {
+            left: b[0] * spec.width,
+            top: (1 - b[1] - b[3]) * spec.height,
+            width: b[2] * spec.width,
+            height: b[3] * spec.height
+        };
+    }
+
+    function mapping(axes, view, rect) {
+        return {
+            x: function(x) {
+                return rect.left + (forward(axes.xscale, x) - view.x0)
+                    / (view.x1 - view.x0) * rect.width;
+            },
+            y: function(y) {
+                return rect.top + rect.height - (forward(axes.yscale, y) - view.y0)
+                    / (view.y1 - view.y0) * rect.height;
+            }
+        };
+    }
+
+    ///////////
+    // Ticks //
+    ///////////
+
+    function ticks(scale, a, b, count) {
+        var lo = Math.min(a, b), hi = Math.max(a, b);
+        var span = hi - lo;
+        if (!(span > 0) || !isFinite(span)) return [];
+        var step;
+        if (scale === "log") {
+            step = Math.max(1, Math.ceil(span / count));
+        } else {
+            step = Math.pow(10, Math.floor(Math.log10(span / count)));
+            var ratio = span / count / step;
+            if (ratio >= 7.5) step *= 10;
+            else if (ratio >= 3.5) step *= 5;
+            else if (ratio >= 1.5) step *= 2;
+        }
+        var result = [];
+        for (var tick = Math.ceil(lo / step) * step; tick <= hi + step * 1e-9; tick += step) {
+            result.push({position: tick, step: step});
+        }
+        return result;
+    }
+
+    function format(scale, tick) {
+        var value = backward(scale, tick.position);
+        if (scale === "log") {
+            return "1e" + Math.round(tick.position);
+        }
+        if (Math.abs(value) < tick.step * 1e-6) return "0";
+        var decimals = Math.max(0, -Math.floor(Math.log10(tick.step)));
+        if (Math.abs(value) >= 1e6 || decimals > 6) return value.toExponential(2);
+        return value.toFixed(decimals);
+    }
+
+    /////////////
+    // Drawing //
+    /////////////
+
+    function drawLine(ctx, line, map) {
+        ctx.globalAlpha = line.alpha === null ? 1 : line.alpha;
+        ctx.strokeStyle = ctx.fillStyle = line.color;
+        ctx.lineWidth = line.width;
+        ctx.setLineDash((line.dashes || []).map(function(d) { return d * line.width; }));
+        if (line.dashes !== null) {
+            ctx.beginPath();
+            var pen = false;
+            for (var i = 0; i < line.x.length; i++) {
+                var x = map.x(line.x[i]), y = map.y(line.y[i]);
+                if (!isFinite(x) || !isFinite(y)) {
+                    pen = false;
+                } else if (pen) {
+                    ctx.lineTo(x, y);
+                } else {
+                    ctx.moveTo(x, y);
+                    pen = true;
+                }
+            }
+            ctx.stroke();
+        }
+        ctx.setLineDash([]);
+        if (line.marker) {
+            for (var j = 0; j < line.x.length; j++) {
+                ctx.beginPath();
+                ctx.arc(map.x(line.x[j]), map.y(line.y[j]), line.markersize / 2, 0, 2 * Math.PI);
+                ctx.fill();
+            }
+        }
+        ctx.globalAlpha = 1;
+    }
+
+    function drawScatter(ctx, scatter, map) {
+        ctx.fillStyle = scatter.color;
+        for (var i = 0; i < scatter.x.length; i++) {
+            if (scatter.colors) {
+                var c = scatter.colors.subarray(4 * i, 4 * i + 4);
+                ctx.fillStyle = "rgba(" + c[0] + "," + c[1] + "," + c[2] + "," + c[3] / 255 + ")";
+            }
+            var size = scatter.sizes[Math.min(i, scatter.sizes.length - 1)];
+            ctx.beginPath();
+            ctx.arc(map.x(scatter.x[i]), map.y(scatter.y[i]), size / 2, 0, 2 * Math.PI);
+            ctx.fill();
+        }
+    }
+
+    function drawBar(ctx, bar, map) {
+        var x0 = map.x(bar.x), x1 = map.x(bar.x + bar.width);
+        var y0 = map.y(bar.y), y1 = map.y(bar.y + bar.height);
+        ctx.fillStyle = bar.color;
+        ctx.fillRect(Math.min(x0, x1), Math.min(y0, y1), Math.abs(x1 - x0), Math.abs(y1 - y0));
+    }
+
+    function drawLegend(ctx, entries, rect, fontsize) {
+        var height = fontsize * 1.4;
+        var width = 0;
+        entries.forEach(function(entry) {
+            width = Math.max(width, ctx.measureText(entry.label).width);
+        });
+        width += 3 * fontsize;
+        var left = rect.left + rect.width - width - fontsize / 2;
+        var top = rect.top + fontsize / 2;
+        ctx.fillStyle = "rgba(255,255,255,0.8)";
+        ctx.strokeStyle = "#cccccc";
+        ctx.lineWidth = 1;
+        ctx.fillRect(left, top, width, height * entries.length + fontsize / 2);
+        ctx.strokeRect(left, top, width, height * entries.length + fontsize / 2);
+        ctx.textAlign = "left";
+        ctx.textBaseline = "middle";
+        entries.forEach(function(entry, idx) {
+            var y = top + fontsize / 4 + height * (idx + 0.5);
+            ctx.fillStyle = entry.color;
+            ctx.fillRect(left + fontsize / 2, y - 1.5, 1.5 * fontsize, 3);
+            ctx.fillStyle = "#000000";
+            ctx.fillText(entry.label, left + 2.5 * fontsize, y);
+        });
+    }
+
+    function drawAxes(ctx, spec, axes, view, hover) {
+        var rect = rectangle(spec, axes);
+        var map = mapping(axes, view, rect);
+        var fontsize = spec.fontsize;
+        ctx.font = fontsize + "px sans-serif";
+        ctx.fillStyle = axes.facecolor;
+        ctx.fillRect(rect.left, rect.top, rect.width, rect.height);
+        // Ticks and grid
+        ctx.fillStyle = "#000000";
+        ctx.strokeStyle = "#000000";
+        ctx.lineWidth = 1;
+        ctx.textAlign = "center";
+        ctx.textBaseline = "top";
+        ticks(axes.xscale, view.x0, view.x1, rect.width / (6 * fontsize)).forEach(function(tick) {
+            var x = map.x(backward(axes.xscale, tick.position));
+            if (axes.grid) {
+                ctx.strokeStyle = "#b0b0b0";
+                ctx.beginPath(); ctx.moveTo(x, rect.top); ctx.lineTo(x, rect.top + rect.height); ctx.stroke();
+                ctx.strokeStyle = "#000000";
+            }
+            ctx.beginPath(); ctx.moveTo(x, rect.top + rect.height); ctx.lineTo(x, rect.top + rect.height + 4); ctx.stroke();
+            ctx.fillText(format(axes.xscale, tick), x, rect.top + rect.height + 6);
+        });
+        ctx.textAlign = "right";
+        ctx.textBaseline = "middle";
+        ticks(axes.yscale, view.y0, view.y1, rect.height / (3 * fontsize)).forEach(function(tick) {
+            var y = map.y(backward(axes.yscale, tick.position));
+            if (axes.grid) {
+                ctx.strokeStyle = "#b0b0b0";
+                ctx.beginPath(); ctx.moveTo(rect.left, y); ctx.lineTo(rect.left + rect.width, y); ctx.stroke();
+                ctx.strokeStyle = "#000000";
+            }
+            ctx.beginPath(); ctx.moveTo(rect.left - 4, y); ctx.lineTo(rect.left, y); ctx.stroke();
+            ctx.fillText(format(axes.yscale, tick), rect.left - 6, y);
+        });
+        // Artists in the order of their zorder
+        ctx.save();
+        ctx.beginPath();
+        ctx.rect(rect.left, rect.top, rect.width, rect.height);
+        ctx.clip();
+        var artists = [];
+        axes.bars.forEach(function(bar) { artists.push([1, drawBar, bar]); });
+        axes.scatters.forEach(function(scatter) { artists.push([scatter.zorder, drawScatter, scatter]); });
+        axes.lines.forEach(function(line) { artists.push([line.zorder, drawLine, line]); });
+        artists.sort(function(a, b) { return a[0] - b[0]; });
+        artists.forEach(function(artist) { artist[1](ctx, artist[2], map); });
+        ctx.restore();
+        // Frame, labels and legend
+        ctx.strokeStyle = "#000000";
+        ctx.lineWidth = 1;
+        ctx.strokeRect(rect.left, rect.top, rect.width, rect.height);
+        ctx.fillStyle = "#000000";
+        ctx.textAlign = "center";
+        ctx.textBaseline = "bottom";
+        ctx.fillText(axes.title, rect.left + rect.width / 2, rect.top - fontsize / 2);
+        ctx.textBaseline = "top";
+        ctx.fillText(axes.xlabel, rect.left + rect.width / 2, rect.top + rect.height + 2 * fontsize);
+        ctx.save();
+        ctx.translate(rect.left - 4.5 * fontsize, rect.top + rect.height / 2);
+        ctx.rotate(-Math.PI / 2);
+        ctx.textBaseline = "bottom";
+        ctx.fillText(axes.ylabel, 0, 0);
+        ctx.restore();
+        if (axes.legend && axes.legend.length) {
+            drawLegend(ctx, axes.legend, rect, fontsize);
+        }
+        if (hover) {
+            ctx.beginPath();
+            ctx.arc(map.x(hover.x), map.y(hover.y), 4, 0, 2 * Math.PI);
+            ctx.stroke();
+            ctx.textAlign = "left";
+            ctx.textBaseline = "top";
+            ctx.fillText("x=" + hover.x.toPrecision(6) + ", y=" + hover.y.toPrecision(6),
+                         rect.left + fontsize / 2, rect.top + fontsize / 2);
+        }
+    }
+
+    function draw(plot) {
+        var spec = plot.spec;
+        var ratio = window.devicePixelRatio || 1;
+        var ctx = plot.ctx;
+        ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        ctx.fillStyle = spec.facecolor;
+        ctx.fillRect(0, 0, spec.width, spec.height);
+        spec.axes.forEach(function(axes, idx) {
+            drawAxes(ctx, spec, axes, plot.views[idx], plot.hover && plot.hover.axes === idx ? plot.hover : null);
+        });
+    }
+
+    //////////////////
+    // Interaction //
+    //////////////////
+
+    function position(canvas, event) {
+        var bounds = canvas.getBoundingClientRect();
+        return {x: event.clientX - bounds.left, y: event.clientY - bounds.top};
+    }
+
+    // Index of the axes under a point
+    function axesAt(spec, point) {
+        for (var idx = spec.axes.length - 1; idx >= 0; idx--) {
+            var rect = rectangle(spec, spec.axes[idx]);
+            if (point.x >= rect.left && point.x <= rect.left + rect.width
+                && point.y >= rect.top && point.y <= rect.top + rect.height) {
+                return idx;
+            }
+        }
+        return -1;
+    }
+
+    // Nearest data point within 10 pixels
+    function nearest(spec, plot, idx, point) {
+        var axes = spec.axes[idx];
+        var map = mapping(axes, plot.views[idx], rectangle(spec, axes));
+        var best = null, bestDistance = 100;
+        axes.lines.concat(axes.scatters).forEach(function(artist) {
+            for (var i = 0; i < artist.x.length; i++) {
+                var dx = map.x(artist.x[i]) - point.x, dy = map.y(artist.y[i]) - point.y;
+                var distance = dx * dx + dy * dy;
+                if (distance < bestDistance) {
+                    bestDistance = distance;
+                    best = {axes: idx, x: artist.x[i], y: artist.y[i]};
+                }
+            }
+        });
+        return best;
+    }
+
+    function attach(element) {
+        var canvas = document.createElement("canvas");
+        element.appendChild(canvas);
+        var drag = null;
+        canvas.addEventListener("wheel", function(event) {
+            var plot = element.plotwist;
+            var point = position(canvas, event);
+            var idx = axesAt(plot.spec, point);
+            if (idx < 0) return;
+            event.preventDefault();
+            var rect = rectangle(plot.spec, plot.spec.axes[idx]);
+            var view = plot.views[idx];
+            var factor = Math.exp(event.deltaY * 0.002);
+            var cx = view.x0 + (point.x - rect.left) / rect.width * (view.x1 - view.x0);
+            var cy = view.y0 + (rect.top + rect.height - point.y) / rect.height * (view.y1 - view.y0);
+            plot.views[idx] = {
+                x0: cx + (view.x0 - cx) * factor, x1: cx + (view.x1 - cx) * factor,
+                y0: cy + (view.y0 - cy) * factor, y1: cy + (view.y1 - cy) * factor
+            };
+            draw(plot);
+        });
+        canvas.addEventListener("mousedown", function(event) {
+            var plot = element.plotwist;
+            var point = position(canvas, event);
+            var idx = axesAt(plot.spec, point);
+            if (idx >= 0) drag = {idx: idx, point: point, view: plot.views[idx]};
+        });
+        window.addEventListener("mouseup", function() { drag = null; });
+        canvas.addEventListener("mousemove", function(event) {
+            var plot = element.plotwist;
+            var point = position(canvas, event);
+            if (drag) {
+                var rect = rectangle(plot.spec, plot.spec.axes[drag.idx]);
+                var view = drag.view;
+                var dx = (point.x - drag.point.x) / rect.width * (view.x1 - view.x0);
+                var dy = (point.y - drag.point.y) / rect.height * (view.y1 - view.y0);
+                plot.views[drag.idx] = {x0: view.x0 - dx, x1: view.x1 - dx,
+                                        y0: view.y0 + dy, y1: view.y1 + dy};
+                plot.hover = null;
+            } else {
+                var idx = axesAt(plot.spec, point);
+                plot.hover = idx < 0 ? null : nearest(plot.spec, plot, idx, point);
+            }
+            draw(plot);
+        });
+        canvas.addEventListener("dblclick", function() {
+            var plot = element.plotwist;
+            plot.views = plot.spec.axes.map(initialView);
+            draw(plot);
+        });
+        return canvas;
+    }
+
+    function observe(element, src) {
+        element.plotwistSource = src;
+        if (!observer) {
+            observer = new IntersectionObserver(function(entries) {
+                entries.forEach(function(entry) {
+                    if (!entry.isIntersecting) return;
+                    observer.unobserve(entry.target);
+                    entry.target.plotwistVisible = true;
+                    show(entry.target.id, entry.target.plotwistSource);
+                });
+            }, {rootMargin: "200px"});
+        }
+        observer.observe(element);
+    }
+
+    function show(id, src) {
+        var element = document.getElementById(id);
+        if (window.plotwist_lazy && !element.plotwistVisible
+                && "IntersectionObserver" in window) {
+            observe(element, src);
+            return;
+        }
+        load(src, function(spec) {
+            var canvas = element.plotwist ? element.plotwist.canvas : attach(element);
+            var ratio = window.devicePixelRatio || 1;
+            spec = prepare(spec);
+            canvas.width = Math.round(spec.width * ratio);
+            canvas.height = Math.round(spec.height * ratio);
+            canvas.style.width = spec.width + "px";
+            canvas.style.height = spec.height + "px";
+            element.plotwist = {
+                spec: spec,
+                canvas: canvas,
+                ctx: canvas.getContext("2d"),
+                views: spec.axes.map(initialView),
+                hover: null
+            };
+            draw(element.plotwist);
+        });
+    }
+
+    window.plotwist = {define: define, load: load, show: show};
+})();
@@ -2,34 +2,61 @@
 A submodule with lots of helper functions for processing data
 """
 
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from typing import List, Tuple, Callable
 
 # Signal processing related functions
-def moving_average(signal: np.ndarray, n: int) -> np.ndarray:
+def moving_average(signal: np.ndarray, n: int, axis: int = -1) -> np.ndarray:
     """
     Compute the moving average of a signal with a window of size n.
 
     Args:
-        signal: np.ndarray, input signal
+        signal: np.ndarray, input signal. If it has more than one
+                dimension, each signal along the axis is averaged.
         n: int, window size
+        axis: int, axis along which the signal is averaged. Default is -1
 
     Returns:
         np.ndarray, moving average of the signal
 
     Remarks:
         Averaging window is made smaller at the edges of the signal.
+        The window sums are differences of a cumulative sum, so the
+        cost does not depend on the window size. Like a sum over the
+        window, windows with a NaN or with both inf and -inf are NaN
+        and windows with only inf (or -inf) are inf (or -inf).
     """
 
-    averages = np.zeros(len(signal))
-    for i in range(len(signal)):
-        # Compute the bounds of the averaging window
-        delta = min([i, len(signal) - (i + 1), n // 2])
-        i_low = i - delta
-        i_high = i + delta + 1
-        # Compute the average
-        averages[i] = 1 / (1 + 2 * delta) * np.sum(signal[i_low:i_high])
-    return averages
+    signal = np.moveaxis(np.asarray(signal, dtype=float), axis, -1)
+    length = signal.shape[-1]
+    # Half width of the (shrinking) window of each sample
+    idx = np.arange(length)
+    delta = np.minimum(np.minimum(idx, length - (idx + 1)), n // 2)
+    low, high = idx - delta, idx + delta + 1
+
+    def window_sums(values: np.ndarray) -> np.ndarray:
+        cumsum = np.zeros(values.shape[:-1] + (length + 1,), dtype=values.dtype)
+        np.cumsum(values, axis=-1, out=cumsum[..., 1:])
+        return cumsum[..., high] - cumsum[..., low]
+
+    # Non-finite samples are averaged as zeros and only
+    # change the windows they are in afterwards
+    finite = np.isfinite(signal)
+    values = np.where(finite, signal, 0) if not finite.all() else signal
+    # Subtract the mean to keep the cumulative sum small,
+    # which keeps the differences of it accurate
+    mean = values.mean(axis=-1, keepdims=True) if length else 0
+    averages = mean + window_sums(values - mean) / (1 + 2 * delta)
+    if not finite.all():
+        nans = window_sums(np.isnan(signal).astype(np.int64)) > 0
+        infs = window_sums((signal == np.inf).astype(np.int64)) > 0
+        negative_infs = window_sums((signal == -np.inf).astype(np.int64)) > 0
+        averages[infs] = np.inf
+        averages[negative_infs] = -np.inf
+        averages[nans | (infs & negative_infs)] = np.nan
+    return np.moveaxis(averages, -1, axis)
 
 # Signal distance related functions
 def mean_squared_signal_distance(signal1: np.ndarray, signal2: np.ndarray) -> float:
@@ -60,8 +87,141 @@ def mean_absolute_signal_distance(signal1: np.ndarray, signal2: np.ndarray) -> f
 
     return np.mean(np.abs(signal1 - signal2))
 
+def correlation_signal_distance(signal1: np.ndarray, signal2: np.ndarray) -> float:
+    """
+    Compute the correlation distance between two signals, i.e. one
+    minus their Pearson correlation coefficient.
+
+    Args:
+        signal1: np.ndarray, first signal
+        signal2: np.ndarray, second signal
+
+    Returns:
+        float, correlation distance between the signals (0 for perfectly
+        correlated, 2 for perfectly anti-correlated signals)
+    """
+
+    centered1 = signal1 - np.mean(signal1)
+    centered2 = signal2 - np.mean(signal2)
+    return 1 - np.sum(centered1 * centered2) / np.sqrt(
+        np.sum(centered1 ** 2) * np.sum(centered2 ** 2))
+
+# Distances whose scores for all shifts can be computed at once
+# from a cross-correlation (see _shift_scores)
+FFT_DISTANCES = {
+    mean_squared_signal_distance: "squared",
+    correlation_signal_distance: "correlation",
+}
+# Relative error bound of the cross-correlation and running sums.
+# Shifts whose scores are within it of the best score are
+# compared again with the exact distance.
+FFT_TOLERANCE = 1e-9
+
+def _window_sums(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Compute the sums of values[..., start:start + length] with a cumulative sum.
+    The starts and lengths broadcast against the batch axes of the values.
+    """
+
+    cumsum = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=cumsum[..., 1:])
+    ends = starts + lengths
+    if cumsum.ndim == 1:
+        return cumsum[ends] - cumsum[starts]
+    shape = np.broadcast_shapes(cumsum.shape[:-1] + (1,), np.shape(ends))
+    return (np.take_along_axis(cumsum, np.broadcast_to(ends, shape), -1)
+            - np.take_along_axis(cumsum, np.broadcast_to(starts, shape), -1))
+
+def _shift_scores(signal1: np.ndarray, signal2: np.ndarray, shifts: np.ndarray,
+                  kind: str, lengths2: np.ndarray | None = None
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the distances between signal1[shift:shift + len(signal2)] and the
+    overlapping start of signal2 for all shifts at once. The products of the
+    signals are summed by an FFT cross-correlation, the other sums are running
+    sums.
+
+    Args:
+        signal1: np.ndarray, first signal
+        signal2: np.ndarray, second signal, or a 2D array of second signals
+                 that are padded at their end
+        shifts: np.ndarray, shifts to score, with an overlap of at least one
+        kind: str, "squared" or "correlation" (see FFT_DISTANCES)
+        lengths2: np.ndarray | None, unpadded lengths of the second signals
+                  as a column (shape (k, 1)). Default is the full length
+
+    Returns:
+        np.ndarray, approximate distance for each (signal and) shift
+        np.ndarray, error bound of each distance
+    """
+
+    length1 = signal1.shape[-1]
+    length2 = signal2.shape[-1]
+    if lengths2 is None:
+        lengths2 = np.array(length2)
+    valid = np.arange(length2) < lengths2
+    lengths = np.minimum(lengths2, length1 - shifts)
+    # Moving the signals closer to zero makes the sums more accurate.
+    # Both distances do not change if the same constant is subtracted
+    # from both signals, the correlation neither for separate constants.
+    # The padding of the second signals stays zero.
+    mean1 = signal1.mean()
+    if kind == "squared":
+        mean2 = mean1
+    else:
+        mean2 = np.sum(signal2, axis=-1, keepdims=True) / lengths2
+    signal1 = signal1 - mean1
+    signal2 = np.where(valid, signal2 - mean2, 0)
+    size = 1 << (length1 + length2 - 1).bit_length()
+    spectrum = np.fft.rfft(signal1, size) * np.conj(np.fft.rfft(signal2, size))
+    cross = np.fft.irfft(spectrum, size)[..., shifts]
+    starts2 = np.zeros_like(shifts)
+    squares1 = _window_sums(signal1 ** 2, shifts, lengths)
+    squares2 = _window_sums(signal2 ** 2, starts2, lengths)
+    # The error of the sums is relative to the total energy of the signals
+    error = FFT_TOLERANCE * (np.sum(signal1 ** 2, axis=-1, keepdims=True)
+                             + np.sum(signal2 ** 2, axis=-1, keepdims=True))
+    if kind == "squared":
+        return (squares1 + squares2 - 2 * cross) / lengths, error / lengths
+    sums1 = _window_sums(signal1, shifts, lengths)
+    sums2 = _window_sums(signal2, starts2, lengths)
+    variance1 = lengths * squares1 - sums1 ** 2
+    variance2 = lengths * squares2 - sums2 ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        norm = np.sqrt(variance1 * variance2)
+        scores = 1 - (lengths * cross - sums1 * sums2) / norm
+        bound = lengths * error * (1 / norm + 1 / variance1 + 1 / variance2)
+    # Windows without variance have no defined score
+    # and are left to the exact distance
+    bound[~np.isfinite(bound) | (variance1 <= 0) | (variance2 <= 0)] = np.inf
+    return scores, bound
+
+def _refine_shift(signal1: np.ndarray, signal2: np.ndarray, shifts: np.ndarray,
+                  scores: np.ndarray, bound: np.ndarray,
+                  distance: Callable) -> Tuple[int, float]:
+    """
+    Select the best shift like the loop in find_best_shift does, but only
+    compute the exact distance for the shifts that can be the best one
+    according to the approximate scores.
+    """
+
+    best_distance = distance(signal1[:len(signal2)], signal2)
+    best_shift = 0
+    upper = np.where(np.isfinite(bound), scores + bound, np.inf)
+    threshold = min(np.min(upper[1:], initial=np.inf), best_distance)
+    lower = scores - bound
+    lower[~np.isfinite(lower)] = -np.inf
+    for shift in shifts[1:][lower[1:] <= threshold]:
+        signal1_cut = signal1[shift:shift + len(signal2)]
+        d = distance(signal1_cut, signal2[:len(signal1_cut)])
+        if d < best_distance:
+            best_shift = int(shift)
+            best_distance = d
+    return best_shift, best_distance
+
 def find_best_shift(signal1: np.ndarray, signal2: np.ndarray, max_shift: int, 
-                    distance: Callable = mean_squared_signal_distance) -> Tuple[int, float]:
+                    distance: Callable = mean_squared_signal_distance,
+                    engine: str = "auto") -> Tuple[int, float]:
     """
     Find the best shift to align two signals.
 
@@ -69,12 +229,32 @@ def find_best_shift(signal1: np.ndarray, signal2: np.ndarray, max_shift: int,
         signal1: np.ndarray, first signal
         signal2: np.ndarray, second signal
         max_shift: int, maximum shift to consider
+        distance: Callable, distance function to use
+        engine: str, "loop" computes the distance for each shift, "fft"
+                scores all shifts at once with an FFT cross-correlation,
+                which needs a distance in FFT_DISTANCES. "auto" uses "fft"
+                if possible. Both give the same result.
 
     Returns:
         int, best shift to align the signals
+        float, distance of the signals at the best shift
     """
 
     assert len(signal1) >= len(signal2)
+    if engine not in ("auto", "fft", "loop"):
+        raise ValueError(f"Unknown engine '{engine}'.")
+    if engine == "fft" and distance not in FFT_DISTANCES:
+        raise ValueError("The fft engine only supports the distances "
+                         "in FFT_DISTANCES.")
+    if engine != "loop" and distance in FFT_DISTANCES and len(signal2) > 0:
+        signal1 = np.asarray(signal1)
+        signal2 = np.asarray(signal2)
+        # Shifts without overlap are never the best shift
+        shifts = np.arange(min(max_shift, len(signal1) - 1) + 1)
+        scores, bound = _shift_scores(signal1[:len(shifts) - 1 + len(signal2)]
+                                      .astype(float), signal2.astype(float),
+                                      shifts, FFT_DISTANCES[distance])
+        return _refine_shift(signal1, signal2, shifts, scores, bound, distance)
     best_shift = 0
     best_distance = distance(signal1[:len(signal2)], signal2)
     for shift in range(1, max_shift + 1):
@@ -85,8 +265,76 @@ def find_best_shift(signal1: np.ndarray, signal2: np.ndarray, max_shift: int,
             best_distance = d
     return best_shift, best_distance
 
+# Maximum number of padded samples of the second signals
+# that are scored at once by multi_signal_best_shift_mean_distance
+BATCH_SIZE = 2**22
+
+def _best_shifts_batched(signal1: np.ndarray, signals: List[np.ndarray],
+                         max_shift: int, distance: Callable) -> List[Tuple[int, float]]:
+    """
+    Find the best shifts of many signals with a distance in FFT_DISTANCES.
+    Signals of similar length are padded to a 2D array and scored together.
+    """
+
+    assert all(len(signal1) >= len(signal) for signal in signals)
+    signal1 = np.asarray(signal1)
+    results = [None] * len(signals)
+    shifts = np.arange(min(max_shift, len(signal1) - 1) + 1)
+    order = sorted((idx for idx, signal in enumerate(signals) if len(signal) > 0),
+                   key=lambda idx: len(signals[idx]))
+    for idx, signal in enumerate(signals):
+        if len(signal) == 0:
+            results[idx] = find_best_shift(signal1, signal, max_shift, distance)
+    start = 0
+    while start < len(order):
+        # Take signals until the padded batch is full
+        longest = len(signals[order[start]])
+        end = start + 1
+        while end < len(order):
+            longest = len(signals[order[end]])
+            if (end - start + 1) * longest > BATCH_SIZE:
+                break
+            end += 1
+        batch = order[start:end]
+        longest = len(signals[batch[-1]])
+        padded = np.zeros((len(batch), longest))
+        lengths = np.zeros((len(batch), 1), dtype=int)
+        for row, idx in enumerate(batch):
+            padded[row, :len(signals[idx])] = signals[idx]
+            lengths[row] = len(signals[idx])
+        reference = signal1[:len(shifts) - 1 + longest].astype(float)
+        scores, bound = _shift_scores(reference, padded, shifts,
+                                      FFT_DISTANCES[distance], lengths)
+        for row, idx in enumerate(batch):
+            signal = np.asarray(signals[idx])
+            results[idx] = _refine_shift(signal1, signal, shifts, scores[row],
+                                         bound[row], distance)
+        start = end
+    return results
+
+# Reference signal, maximum shift and distance of a worker process
+# of multi_signal_best_shift_mean_distance
+_reference: Tuple[np.ndarray, int, Callable] | None = None
+
+def _init_shift_worker(signal1: np.ndarray, max_shift: int, distance: Callable) -> None:
+    """
+    Store the arguments that are shared by all signals in a worker process.
+    """
+
+    global _reference
+    _reference = (signal1, max_shift, distance)
+
+def _best_shift_worker(signal: np.ndarray) -> Tuple[int, float]:
+    """
+    Find the best shift of a signal in a worker process.
+    """
+
+    signal1, max_shift, distance = _reference
+    return find_best_shift(signal1, signal, max_shift, distance, engine="loop")
+
 def multi_signal_best_shift_mean_distance(signal1: np.ndarray, signals: List[np.ndarray], 
-                                          max_shift: int = 100, distance: Callable = mean_squared_signal_distance
+                                          max_shift: int = 100, distance: Callable = mean_squared_signal_distance,
+                                          batched: bool = True, workers: int | None = None
                                           ) -> Tuple[float, List[int]]:
     """
     Compute the mean distance of multiple signals to a reference signal, when optimally shifted.
@@ -95,21 +343,45 @@ def multi_signal_best_shift_mean_distance(signal1: np.ndarray, signals: List[np.
         signals: List[np.ndarray], list of signals to compare
         max_shift: int, maximum shift to consider. Default is 100
         distance: Callable, distance function to use
+        batched: bool, score the signals together in padded 2D arrays
+                 for the distances in FFT_DISTANCES. Default is True
+        workers: int | None, number of processes that compare the signals
+                 for other distances. None and 0 compare them one by one
+                 in this process, which is the default. The processes
+                 import the __main__ module again when they are spawned
+                 (the default on macOS and Windows), so a script that
+                 uses workers needs an if __name__ == "__main__" guard.
+                 Distances that can not be pickled (e.g. lambdas) are
+                 always compared in this process
 
     Returns:
         float, mean distance of the signals to the reference signal
         List[int], best shifts for each signal
     """
+    if not batched:
+        results = [find_best_shift(signal1, signal, max_shift, distance)
+                   for signal in signals]
+    elif distance in FFT_DISTANCES:
+        results = _best_shifts_batched(signal1, signals, max_shift, distance)
+    else:
+        try:
+            pickle.dumps(distance)
+        except Exception:
+            workers = 0
+        if not workers or len(signals) < 2:
+            results = [find_best_shift(signal1, signal, max_shift, distance)
+                       for signal in signals]
+        else:
+            workers = min(workers, len(signals))
+            with ProcessPoolExecutor(workers, initializer=_init_shift_worker,
+                                     initargs=(signal1, max_shift, distance)) as executor:
+                results = list(executor.map(_best_shift_worker, signals,
+                                            chunksize=max(1, len(signals) // (4 * workers))))
     total_distance = 0
     totally_considered_data_points = 0
     shifts = []
-    for signal in signals:
-        shift, best_distance = find_best_shift(signal1, signal, max_shift, distance)
+    for signal, (shift, best_distance) in zip(signals, results):
         shifts.append(shift)
         total_distance += best_distance * (len(signal) - shift)
         totally_considered_data_points += len(signal) - shift
     return total_distance / totally_considered_data_points, shifts
-
-
-
-
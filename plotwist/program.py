@@ -3,22 +3,71 @@ Programming Elements
 """
 # Imports
 import os
+import io
+import re
+import copy
+import time
+import shutil
 from abc import ABC, abstractmethod
-from .constants import HEADER
-from typing import List
+from .constants import HEADER, LAZY_LOADER
+from typing import Dict, List, TextIO
 
 ############################
 # Stackers (Compile Modes) #
 ############################
 
+# Sources of images and iframes, which are
+# moved to data-src in lazy mode
+LAZY_SOURCE = re.compile(r"(<(?:img|iframe)\b[^>]*?\s)src=")
+
 # Base class
 class Stacker(ABC):
     """
     A class for stacking items in the html report.
+    The html is written to a sink (e.g. a file) as
+    soon as an item is stacked, while the scripts and
+    assets are collected and written at the end of the
+    report.
+
+    In lazy mode, images and iframes are only loaded when
+    they come close to the viewport, and items with a
+    size reserve their space in the layout until then.
     """
     def __init__(self):
-        self.html = "<html>\n"
-        self.script = "<script>\n"
+        self.sink: TextIO = io.StringIO()
+        self.scripts: List[str] = []
+        self.assets: List[str] = []
+        self.lazy = False
+
+    def start(self, sink: TextIO):
+        """
+        Starts the html report in the sink.
+        """
+        self.sink = sink
+        self.sink.write("<html>\n" + HEADER + "<body>\n")
+
+    def html(self, item) -> str:
+        """
+        Returns the html of the item.
+        """
+        if not self.lazy:
+            return item.html
+        html = LAZY_SOURCE.sub(r"\1data-src=", item.html)
+        if item.size is not None:
+            width, height = item.size
+            html = f"<span style='display: inline-block; min-width: {width:.0f}px; " \
+                   f"min-height: {height:.0f}px;'>{html}</span>"
+        return html
+
+    def collect(self, item):
+        """
+        Collects the script and the assets of the item.
+        """
+        if item.script != "":
+            self.scripts.append(item.script + "\n")
+        for asset in item.assets:
+            if asset not in self.assets:
+                self.assets.append(asset)
 
     @abstractmethod
     def stack(self, item):
@@ -32,31 +81,42 @@ class Stacker(ABC):
         Closes the stacker.
         """
 
-    def end(self):
+    def spawn(self) -> "Stacker":
+        """
+        Returns a new stacker with the same layout for
+        the next page of the report.
+        """
+        stacker = copy.copy(self)
+        stacker.sink = io.StringIO()
+        stacker.scripts = []
+        stacker.assets = []
+        return stacker
+
+    def end(self, footer: str = ""):
         """
         Ends the html report.
         """
         self.close()
-        self.script += "</script>\n"
-        self.html += "</body>\n" + self.script + "</html>"
+        self.sink.write(footer + "</body>\n")
+        for asset in self.assets:
+            self.sink.write(f"<script src='{asset}'></script>\n")
+        self.sink.write("<script>\n")
+        if self.lazy:
+            self.sink.write(LAZY_LOADER)
+        self.sink.writelines(self.scripts)
+        self.sink.write("</script>\n</html>")
 
 # Sub classes
 class NormalStacker(Stacker):
     """
     A class for stacking items in the html report.
     """
-    def __init__(self):
-        super().__init__()
-        self.html += HEADER
-        self.html += "<body>\n"
-
     def stack(self, item):
         """
         Stacks the items in the html report.
         """
-        self.html += item.html + "\n"
-        if item.script != "":
-            self.script += item.script + "\n"
+        self.sink.write(self.html(item) + "\n")
+        self.collect(item)
 
     def close(self):
         """
@@ -70,27 +130,33 @@ class ColumnStacker(Stacker):
     """
     def __init__(self, columns: int):
         super().__init__()
-        self.html += HEADER
-        self.html += "<body>\n"
         self.column = 0
         self.columns = columns
 
+    def spawn(self) -> Stacker:
+        """
+        Returns a new stacker with the same layout for
+        the next page of the report.
+        """
+        stacker = super().spawn()
+        stacker.column = 0
+        return stacker
+
     def stack(self, item):
         """
         Stacks the items in the html report.
         """
-        if item.script != "":
-            self.script += item.script + "\n"
+        self.collect(item)
         if item.mode == "block":
-            self.html += item.html + "<br>"
+            self.sink.write(self.html(item) + "<br>")
             self.column = 0
         else:
-            self.html += item.html
+            self.sink.write(self.html(item))
             self.column += 1
             if self.column == self.columns:
-                self.html += "<br>"
+                self.sink.write("<br>")
                 self.column = 0
-        self.html += "\n"
+        self.sink.write("\n")
 
     def close(self):
         """
@@ -102,18 +168,12 @@ class CenterStacker(Stacker):
     """
     A class for stacking items in the html report.
     """
-    def __init__(self):
-        super().__init__()
-        self.html += HEADER
-        self.html += "<body>\n"
-
     def stack(self, item):
         """
         Stacks the items in the html report.
         """
-        if item.script != "":
-            self.script += item.script + "\n"
-        self.html += f"<center>{item.html}</center><br>\n"
+        self.collect(item)
+        self.sink.write(f"<center>{self.html(item)}</center><br>\n")
 
     def close(self):
         """
@@ -128,12 +188,22 @@ class CenterStacker(Stacker):
 # Base Instructions
 class Item:
     """
-    A class for an item in the html report.
+    A class for an item in the html report. Assets are
+    the paths of scripts the item needs, which are
+    included once in the report. The size (width,
+    height) in pixels is reserved in lazy mode.
+    Items that start a section (titles and subtitles)
+    have a section (level, heading), at which a report
+    can be split into pages.
     """
-    def __init__(self, html, mode="inline", script=""):
+    def __init__(self, html, mode="inline", script="", assets=(), size=None,
+                 section=None):
         self.html = html
         self.mode = mode
         self.script = script
+        self.assets = list(assets)
+        self.size = size
+        self.section = section
 
 class Stackfluencer(ABC):
     """
@@ -171,45 +241,233 @@ class ChangeStacker(Stackfluencer):
         Influences the current stacker
         """
         stacker.close()
-        self.stacker.html = stacker.html
-        self.stacker.script = stacker.script
+        self.stacker.sink = stacker.sink
+        self.stacker.scripts = stacker.scripts
+        self.stacker.assets = stacker.assets
+        self.stacker.lazy = stacker.lazy
         return self.stacker
 
 # Program for the compiler
 program: List[Item | Stackfluencer] = []
 
+###################
+# Build Directory #
+###################
+
+def _builds_dir(name: str) -> str:
+    """
+    Returns the directory holding the builds of a report.
+    """
+    head, tail = os.path.split(os.path.normpath(name))
+    return os.path.join(head, f".{tail}.builds")
+
+def _start_build(name: str) -> str:
+    """
+    Start a new build of the report from the contents
+    of the tmp directory, which are moved into it
+    without being copied.
+
+    Args:
+        name: str: name of the report
+
+    Returns:
+        str: the directory of the new build
+    """
+    builds = _builds_dir(name)
+    build = os.path.join(builds, str(time.time_ns()))
+    os.makedirs(builds, exist_ok=True)
+    if os.path.isdir("tmp"):
+        shutil.move("tmp", build)
+    os.makedirs(f"{build}/plots", exist_ok=True)
+    return build
+
+def _publish(name: str, build: str) -> None:
+    """
+    Atomically point the report at a finished build
+    and remove the older builds.
+
+    Args:
+        name: str: name of the report
+        build: str: the directory of the finished build
+
+    Returns:
+        None
+    """
+    # The report is a symbolic link to the current build.
+    # Replacing the link by a new one is atomic.
+    link = f"{os.path.normpath(name)}.{os.getpid()}.link"
+    os.symlink(os.path.relpath(build, os.path.dirname(link) or "."), link)
+    if os.path.isdir(name) and not os.path.islink(name):
+        # A report made without incremental mode has to
+        # be removed once before the link can take its place
+        shutil.rmtree(name)
+    os.replace(link, name)
+    # Remove the older builds
+    builds = _builds_dir(name)
+    for entry in list(os.scandir(builds)):
+        if entry.path != build:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+#########
+# Pages #
+#########
+
+# Levels of the sections at which a report can be split
+SECTION_LEVELS = {"title": 1, "subtitle": 2}
+
+def _page_path(directory: str, page: int, sharded: bool) -> str:
+    """
+    Returns the path of a page of the report.
+    """
+    if not sharded:
+        return f"{directory}/index.html"
+    return f"{directory}/page_{page + 1}.html"
+
+def _breaks_page(item: Item, items: int, split: str | None,
+                 max_items: int | None) -> bool:
+    """
+    Returns whether an item starts a new page, which is the
+    case if the page is full or the item starts a section
+    at which the report is split.
+    """
+    if items == 0:
+        return False
+    if max_items is not None and items >= max_items:
+        return True
+    return split is not None and item.section is not None \
+        and item.section[0] <= SECTION_LEVELS[split]
+
+def _navigation(page: int, next_page: bool = False) -> str:
+    """
+    Returns the links from a page to the index
+    and to the previous (and the next) page.
+    """
+    links = ["<a href='index.html'>Index</a>"]
+    if page > 0:
+        links.append(f"<a href='page_{page}.html'>Previous</a>")
+    if next_page:
+        links.append(f"<a href='page_{page + 2}.html'>Next</a>")
+    return f"<nav>{' | '.join(links)}</nav>\n"
+
+def _write_index(path: str, headings: List[List[str]]) -> None:
+    """
+    Write the index page that links to all pages
+    and lists the sections on them.
+    """
+    with open(path, "w") as file:
+        file.write("<html>\n" + HEADER + "<body>\n<ol>\n")
+        for page, page_headings in enumerate(headings):
+            file.write(f"<li><a href='page_{page + 1}.html'>Page {page + 1}</a>")
+            if page_headings:
+                file.write(f": {', '.join(page_headings)}")
+            file.write("</li>\n")
+        file.write("</ol>\n</body>\n</html>")
+
 # Compiler
-def make(name: str = "report") -> None:
-    # Delete the report directory if it exists
-    os.system(f"rm -r {name}")
-    # make folders
-    os.makedirs(name, exist_ok=True)
-    os.makedirs(f"{name}/plots", exist_ok=True)
-    # move contents of the tmp directory to the report directory
-    os.system(f"mv tmp/* {name}/")
-    # remove the tmp directory
-    os.system("rm -r tmp")
-    # Initialize a NormalStacker
-    stacker: Stacker = NormalStacker()
-    # Let the stacker compile the program
-    for instruction in program:
-        # If the instruction is an Item
-        # let the stacker stack it
-        if issubclass(type(instruction), Item):
-            stacker.stack(instruction)
-        # If the instruction is a Stackfluencer
-        # influence the stacker
-        elif issubclass(type(instruction), Stackfluencer):
-            stacker = instruction.influence(stacker)
-        # If the instruction is neither an Item
-        # nor a Stackfluencer, then the Program
-        # is invalid.
-        else:
-            raise ValueError("Unknown instruction type.")
-    # Tell the stacker that no more items are coming
-    stacker.end()
-    # Write the html to a file
-    with open(f"{name}/index.html", "w") as file:
-        file.write(stacker.html)
+def make(name: str = "report", incremental: bool = False,
+         lazy: bool = False, split: str | None = None,
+         max_items: int | None = None) -> None:
+    """
+    Compile the program into a html report.
+
+    Args:
+        name: str: name of the report directory
+        incremental: bool: make the report directory a link
+                     to the current build. The link is switched
+                     atomically when the build is finished, so
+                     a reader never sees a missing or half
+                     written report. With the figure cache (see
+                     figure_cache), unchanged plots are hard
+                     linked from the cache instead of written.
+        lazy: bool: load plots only when they come close
+              to the viewport, so that large reports
+              open fast.
+        split: str | None: split the report into pages at
+               each "title" or at each "title" and
+               "subtitle". The pages are linked from an
+               index page and only load their own plots.
+        max_items: int | None: start a new page when a page
+                   has this many items.
+
+    Returns:
+        None
+    """
+    if split is not None and split not in SECTION_LEVELS:
+        raise ValueError(f"Unknown split '{split}'.")
+    if max_items is not None and max_items < 1:
+        raise ValueError(f"max_items must be at least 1, not {max_items}.")
+    # Wait for figures that are still rendered in the background.
+    # The renderer imports matplotlib, so it is imported here.
+    from .render import wait
+    wait()
+    if incremental:
+        directory = _start_build(name)
+    else:
+        directory = name
+        # Delete the report directory if it exists
+        os.system(f"rm -r {name}")
+        # make folders
+        os.makedirs(name, exist_ok=True)
+        os.makedirs(f"{name}/plots", exist_ok=True)
+        # move contents of the tmp directory to the report directory
+        os.system(f"mv tmp/* {name}/")
+        # remove the tmp directory
+        os.system("rm -r tmp")
+    # Write the pages to temporary files while compiling
+    # and move them into place when the report is complete
+    sharded = split is not None or max_items is not None
+    # Headings of the sections on each page
+    headings: List[List[str]] = [[]]
+    file = open(_page_path(directory, 0, sharded) + ".tmp", "w",
+                buffering=2**16)
+    try:
+        # Initialize a NormalStacker
+        stacker: Stacker = NormalStacker()
+        stacker.lazy = lazy
+        stacker.start(file)
+        if sharded:
+            file.write(_navigation(0))
+        items = 0
+        # Let the stacker compile the program
+        for instruction in program:
+            # If the instruction is an Item
+            # let the stacker stack it
+            if issubclass(type(instruction), Item):
+                # Continue on a new page with the same layout
+                if sharded and _breaks_page(instruction, items, split, max_items):
+                    stacker.end(_navigation(len(headings) - 1, True))
+                    file.close()
+                    file = open(_page_path(directory, len(headings), sharded)
+                                + ".tmp", "w", buffering=2**16)
+                    stacker = stacker.spawn()
+                    stacker.start(file)
+                    file.write(_navigation(len(headings)))
+                    headings.append([])
+                    items = 0
+                if instruction.section is not None:
+                    headings[-1].append(instruction.section[1])
+                stacker.stack(instruction)
+                items += 1
+            # If the instruction is a Stackfluencer
+            # influence the stacker
+            elif issubclass(type(instruction), Stackfluencer):
+                stacker = instruction.influence(stacker)
+            # If the instruction is neither an Item
+            # nor a Stackfluencer, then the Program
+            # is invalid.
+            else:
+                raise ValueError("Unknown instruction type.")
+        # Tell the stacker that no more items are coming
+        stacker.end(_navigation(len(headings) - 1) if sharded else "")
+    finally:
+        file.close()
+    for page in range(len(headings)):
+        path = _page_path(directory, page, sharded)
+        os.replace(path + ".tmp", path)
+    if sharded:
+        _write_index(f"{directory}/index.html", headings)
+    # Switch the report to the new build
+    if incremental:
+        _publish(name, directory)
     # Clear the program
     program.clear()
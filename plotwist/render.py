@@ -0,0 +1,200 @@
+"""
+Rendering engine that turns finished figures into files
+"""
+# Imports
+import os
+import pickle
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List, Tuple
+import matplotlib as mpl
+from matplotlib.figure import Figure
+from . import cache
+from . import decimate
+from . import interactive
+
+###########
+# Globals #
+###########
+
+# Process pool that renders the figures in the background.
+# If it is None, figures are rendered on the main thread.
+executor: ProcessPoolExecutor | None = None
+# Renders that were handed to the executor but were
+# not yet waited for
+pending: List[Future] = []
+# Functions and their arguments that are called once
+# the pending renders are finished
+deferred: List[Tuple[Callable, tuple]] = []
+# Whether a figure that can not be pickled was rendered
+# on the main thread, which is only warned about once
+warned = False
+
+#############
+# Functions #
+#############
+
+def save(fig: Figure, path: str) -> None:
+    """
+    Save a figure to a file. Paths ending with '.html'
+    are written with mpld3, paths ending with '.js' as
+    lightweight interactive plots (see interactive.py),
+    all others with savefig.
+    SVG files are written without a date, so that an
+    unchanged figure gives an identical file.
+
+    Args:
+        fig: Figure: the figure to save
+        path: str: the output path
+
+    Returns:
+        None
+    """
+    if path.endswith(".html"):
+        import mpld3
+        mpld3.save_html(fig, path)
+    elif path.endswith(".js"):
+        interactive.save_js(fig, path)
+    elif path.endswith(".svg"):
+        fig.savefig(path, metadata={"Date": None})
+    else:
+        fig.savefig(path)
+
+def _save_and_store(fig: Figure, path: str, cached: str | None) -> None:
+    """
+    Save a figure and, if a cache entry is given,
+    store the output in the figure cache.
+    """
+    save(fig, path)
+    if cached is not None:
+        cache.store(path, cached)
+
+def _init_worker() -> None:
+    """
+    Initialize a rendering worker process.
+    """
+    # Workers never show figures, so use a non-GUI backend
+    import matplotlib.pyplot as plt
+    plt.switch_backend("agg")
+
+def _render_pickled(data: bytes, path: str, rc: dict,
+                    cached: str | None) -> None:
+    """
+    Unpickle a figure and save it (runs in a worker process).
+    """
+    import matplotlib.pyplot as plt
+    fig = pickle.loads(data)
+    with mpl.rc_context(rc):
+        _save_and_store(fig, path, cached)
+    plt.close(fig)
+
+def parallel_rendering(workers: int | None = None) -> None:
+    """
+    Render figures in a pool of background processes,
+    so that the script can build the next figures while
+    the earlier ones are saved. make() waits for all
+    pending renders before it writes the report.
+
+    Args:
+        workers: int | None: number of worker processes.
+                 None uses one worker per CPU and 0
+                 switches back to rendering on the
+                 main thread.
+
+    Returns:
+        None
+    """
+    global executor
+    wait()
+    if executor is not None:
+        executor.shutdown()
+        executor = None
+    if workers == 0:
+        return
+    executor = ProcessPoolExecutor(workers or os.cpu_count(),
+                                   initializer=_init_worker)
+
+def render(fig: Figure, path: str) -> None:
+    """
+    Render a figure to a file, either right away or, if
+    parallel rendering is enabled, in the background.
+    If line decimation is enabled, the lines of the
+    figure are decimated first. If the figure cache is
+    enabled and holds an output for the same figure
+    contents, it is reused instead.
+
+    Args:
+        fig: Figure: the figure to render
+        path: str: the output path
+
+    Returns:
+        None
+    """
+    decimate.decimate(fig)
+    # Look the figure up in the cache
+    cached = None
+    if cache.directory is not None:
+        key = cache.fingerprint(fig, os.path.splitext(path)[1])
+        # Figures that can not be hashed bypass the cache
+        if key is not None:
+            if cache.fetch(key, path):
+                return
+            cached = cache.entry(key, path)
+    if executor is None:
+        _save_and_store(fig, path, cached)
+        return
+    # Pickle now: the caller is free to clear the
+    # figure as soon as this function returns
+    try:
+        data = pickle.dumps(fig)
+    except (pickle.PicklingError, AttributeError, TypeError) as error:
+        # Figures that can not be pickled, e.g. with a
+        # lambda tick formatter, are rendered right away
+        global warned
+        if not warned:
+            warnings.warn(f"Rendering figures that can not be pickled on the "
+                          f"main thread ({error})")
+            warned = True
+        _save_and_store(fig, path, cached)
+        return
+    rc = {name: value for name, value in mpl.rcParams.items()
+          if name != "backend"}
+    pending.append(
+        executor.submit(_render_pickled, data, path, rc, cached)
+    )
+
+def defer(function: Callable, *args) -> None:
+    """
+    Call a function that needs the rendered files,
+    e.g. to post-process them, in the next wait().
+
+    Args:
+        function: Callable: the function
+        *args: tuple: arguments for the function
+
+    Returns:
+        None
+    """
+    deferred.append((function, args))
+
+def wait() -> None:
+    """
+    Block until all pending renders are finished,
+    call the deferred functions and shrink the figure
+    cache to its maximum size. Errors raised in a
+    worker are raised again here.
+
+    Returns:
+        None
+    """
+    futures = pending.copy()
+    pending.clear()
+    calls = deferred.copy()
+    deferred.clear()
+    errors = [future.exception() for future in futures]
+    cache.evict()
+    for error in errors:
+        if error is not None:
+            raise error
+    for function, args in calls:
+        function(*args)
@@ -0,0 +1,7 @@
+"""
+Shared configuration of the tests
+"""
+import matplotlib
+
+# The tests never show figures
+matplotlib.use("agg")
@@ -0,0 +1,87 @@
+"""
+Tests of the cache keys of figures
+"""
+import os
+import pytest
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.patheffects as pe
+from matplotlib.colors import LogNorm
+from matplotlib.table import table
+from matplotlib.ticker import FormatStrFormatter, FuncFormatter
+from plotwist import cache, render
+
+def key(build) -> str | None:
+    """
+    Returns the cache key of a figure built by a function.
+    """
+    fig, ax = plt.subplots()
+    ax.plot([0, 1, 2], [1, 3, 2], label="line")
+    build(ax)
+    try:
+        return cache.fingerprint(fig, ".svg")
+    finally:
+        plt.close(fig)
+
+def digits_formatter(digits: int) -> FuncFormatter:
+    return FuncFormatter(lambda x, pos: f"{x:.{digits}f}")
+
+class Opaque:
+    pass
+
+# Data of images
+IMAGE = np.arange(1, 5).reshape(2, 2)
+
+def test_same_figure_same_key():
+    assert key(lambda ax: ax.legend()) == key(lambda ax: ax.legend())
+
+@pytest.mark.parametrize("build1, build2", [
+    (lambda ax: ax.set_xticks([0, 1, 2]), lambda ax: ax.set_xticks([0, 0.5, 2])),
+    (lambda ax: ax.xaxis.set_major_formatter(FormatStrFormatter("%.1f")),
+     lambda ax: ax.xaxis.set_major_formatter(FormatStrFormatter("%.2f"))),
+    (lambda ax: ax.xaxis.set_major_formatter(digits_formatter(1)),
+     lambda ax: ax.xaxis.set_major_formatter(digits_formatter(2))),
+    (lambda ax: ax.legend(loc="upper left"), lambda ax: ax.legend(loc="lower right")),
+    (lambda ax: ax.imshow(IMAGE), lambda ax: ax.imshow(IMAGE, norm=LogNorm())),
+    (lambda ax: ax.scatter([1, 2], [3, 4], c=[1, 2]),
+     lambda ax: ax.scatter([1, 2], [3, 4], c=[1, 2], norm=LogNorm())),
+    (lambda ax: ax.text(0, 0, "a"),
+     lambda ax: ax.text(0, 0, "a", bbox=dict(facecolor="red"))),
+    (lambda ax: ax.plot([0, 1], [1, 0], lw=10),
+     lambda ax: ax.plot([0, 1], [1, 0], lw=10, solid_capstyle="round")),
+    (lambda ax: ax.plot([0, 1], [1, 0], lw=10),
+     lambda ax: ax.plot([0, 1], [1, 0], lw=10, solid_joinstyle="bevel")),
+    (lambda ax: ax.plot([0, 1], [1, 0]),
+     lambda ax: ax.plot([0, 1], [1, 0], transform=ax.transAxes)),
+], ids=["ticks", "format string", "closure", "legend loc", "image norm",
+        "collection norm", "text bbox", "capstyle", "joinstyle", "transform"])
+def test_different_figures_different_keys(build1, build2):
+    assert key(build1) != key(build2)
+
+def test_tick_labels_partial_formatter():
+    # set_xticklabels uses a functools.partial formatter
+    def build(labels):
+        return lambda ax: (ax.set_xticks([0, 1, 2]), ax.set_xticklabels(labels))
+    assert key(build(["a", "b", "c"])) is not None
+    assert key(build(["a", "b", "c"])) != key(build(["a", "b", "d"]))
+
+def test_uncacheable_figure_bypasses_cache(tmp_path, monkeypatch):
+    opaque = Opaque()
+    build = lambda ax: ax.xaxis.set_major_formatter(
+        FuncFormatter(lambda x, pos: f"{x}{opaque and ''}"))
+    assert key(build) is None
+    monkeypatch.setattr(cache, "directory", str(tmp_path / "cache"))
+    os.makedirs(cache.directory)
+    fig, ax = plt.subplots()
+    build(ax)
+    render.render(fig, str(tmp_path / "plot.svg"))
+    plt.close(fig)
+    assert os.path.exists(tmp_path / "plot.svg")
+    assert os.listdir(cache.directory) == []
+
+@pytest.mark.parametrize("build", [
+    lambda ax: ax.plot([0, 1], [1, 0], path_effects=[pe.withStroke(linewidth=3)]),
+    lambda ax: table(ax, [["a"]]),
+], ids=["path effects", "table"])
+def test_uncovered_artists_are_uncacheable(build):
+    assert key(build) is None
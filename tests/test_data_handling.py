@@ -0,0 +1,136 @@
+"""
+Tests of the handling of nested dictionaries and SSPE files
+"""
+import numpy as np
+import pytest
+from plotwist.data_handling import NestedDict
+
+def test_nested_dict_leaves_input_untouched():
+    values = np.array([1.0, 2.0])
+    dictionary = {"a": [1, 2, 3], "b": {"c": values, "d": ["x", 1]}}
+    nested = NestedDict(dictionary)
+    nested.extend([["a"], ["b", "d"]], [[4], [2]])
+    assert dictionary == {"a": [1, 2, 3], "b": {"c": values, "d": ["x", 1]}}
+    assert type(dictionary["a"]) is list
+    values[0] = 5.0
+    np.testing.assert_array_equal(nested["b/c"], [1.0, 2.0])
+    np.testing.assert_array_equal(nested["a"], [1, 2, 3, 4])
+
+def test_nested_dict_leaves_are_read_only():
+    nested = NestedDict({"a": [1, 2, 3]})
+    x = nested["a"]
+    with pytest.raises(ValueError, match="read-only"):
+        x += 1
+    y = nested["a"].copy()
+    y += 1
+    np.testing.assert_array_equal(y, [2, 3, 4])
+    np.testing.assert_array_equal(nested["a"], [1, 2, 3])
+
+def test_follower_reloads_a_replaced_file(tmp_path):
+    from plotwist.data_handling import SSPEFollower
+    path = tmp_path / "log.sspe"
+    path.write_text("loss;step\n1.0;0\n2.0;1\n")
+    follower = SSPEFollower(str(path))
+    np.testing.assert_array_equal(follower.update()["loss"], [1.0, 2.0])
+    # A new run replaces the file with a longer one
+    new = tmp_path / "new.sspe"
+    new.write_text("reward;step\n5.0;0\n6.0;1\n7.0;2\n8.0;3\n")
+    new.replace(path)
+    nested = follower.update()
+    np.testing.assert_array_equal(nested["reward"], [5.0, 6.0, 7.0, 8.0])
+    assert "loss" not in nested.dictionary
+
+def test_follower_reloads_a_rewritten_file(tmp_path):
+    from plotwist.data_handling import SSPEFollower
+    path = tmp_path / "log.sspe"
+    path.write_text("loss;step\n1.0;0\n")
+    follower = SSPEFollower(str(path))
+    follower.update()
+    # A new run truncates and writes the same file
+    path.write_text("loss;step\n3.0;0\n4.0;1\n5.0;2\n")
+    np.testing.assert_array_equal(follower.update()["loss"], [3.0, 4.0, 5.0])
+    with open(path, "a") as file:
+        file.write("6.0;3\n")
+    np.testing.assert_array_equal(follower.update()["loss"], [3.0, 4.0, 5.0, 6.0])
+
+def test_runs_from_recursive_pattern(tmp_path):
+    from plotwist.data_handling import make_runs_from_sspe
+    for run in ["a", "b/c", "b/d/e"]:
+        (tmp_path / run).mkdir(parents=True)
+        (tmp_path / run / "log.sspe").write_text("loss;step\n1.0;0\n")
+    nested = make_runs_from_sspe(str(tmp_path / "**" / "*.sspe"), workers=0)
+    assert len(nested.runs) == 3
+
+@pytest.mark.parametrize("workers", [None, 0, 2])
+def test_runs_with_a_bad_file(tmp_path, monkeypatch, workers):
+    from plotwist import data_handling
+    paths = []
+    for run in ["a", "b"]:
+        paths.append(str(tmp_path / f"{run}.sspe"))
+        (tmp_path / f"{run}.sspe").write_text("loss;step\n1.0;0\n2.0;1\n")
+    paths.insert(1, str(tmp_path / "missing.sspe"))
+    if not workers:
+        # The files are loaded in this process by default
+        monkeypatch.setattr(data_handling, "ProcessPoolExecutor", None)
+    with pytest.warns(UserWarning, match="missing.sspe"):
+        nested = data_handling.make_runs_from_sspe(paths, workers=workers)
+    assert nested.runs == ["a", "b"]
+    assert list(nested.errors) == [paths[1]]
+    assert isinstance(nested.errors[paths[1]], FileNotFoundError)
+    np.testing.assert_array_equal(nested["b/loss"], [1.0, 2.0])
+
+def test_cached_load_memory_maps_the_columns(tmp_path):
+    from plotwist.data_handling import make_nested_dict_from_sspe
+    path = tmp_path / "log.sspe"
+    path.write_text("loss;step\n1.0;0\n2.0;1\n")
+    make_nested_dict_from_sspe(str(path), cache=True)
+    nested = make_nested_dict_from_sspe(str(path), cache=True)
+    assert isinstance(nested["loss"], np.memmap)
+    np.testing.assert_array_equal(nested["loss"], [1.0, 2.0])
+    # Extending copies the column out of the memory map
+    nested.extend([["loss"], ["step"]], [[3.0], [2]])
+    assert not isinstance(nested["loss"], np.memmap)
+    np.testing.assert_array_equal(nested["loss"], [1.0, 2.0, 3.0])
+
+def same(value1, value2) -> bool:
+    """
+    Whether two parsed values are identical, including
+    their types, nan and the sign of zero.
+    """
+    if type(value1) is not type(value2):
+        return False
+    if isinstance(value1, dict):
+        return value1.keys() == value2.keys() \
+            and all(same(value1[key], value2[key]) for key in value1)
+    if isinstance(value1, list):
+        return len(value1) == len(value2) \
+            and all(same(element1, element2) for element1, element2 in zip(value1, value2))
+    if isinstance(value1, float):
+        return (np.isnan(value1) and np.isnan(value2)) \
+            or (value1 == value2 and np.copysign(1, value1) == np.copysign(1, value2))
+    return value1 == value2
+
+# Rows of int columns before a cell of another kind, so
+# that the type of the column is inferred as int first
+INT_ROWS = "".join(f"{idx};{idx}.5\n" for idx in range(40))
+
+@pytest.mark.parametrize("text", [
+    "a;b\n1;0.5\n007;1.0\n0;00\n-0;-0.0\n",
+    "a;b\n" + INT_ROWS + "1e5;2.5\n",
+    "a;b\n" + INT_ROWS + "1_000;1_0.5\n",
+    "a;b\n" + INT_ROWS + f"{2**70};{-2**64}\n",
+    "a;b\n" + INT_ROWS + "--5;-+1.5\n",
+    "a;b\r\n1;0.5\r\n2;1.5\r\n",
+    "a;b;c\n1;2\n3;4;5;6\n",
+    "!x = 3\na;b\n1;x\n!y = 'z'\n2;y\n",
+    "a;b\n1;nan\n2;inf\n3;-inf\n4;'s'\n",
+    "a;b\n1;0.5\n2;1.5",
+], ids=["leading zeros", "exponent in int column", "underscores", "big ints",
+        "double sign", "crlf", "ragged rows", "exec lines", "special values",
+        "no final newline"])
+def test_fast_parser_matches_eval(tmp_path, text):
+    from plotwist.data_handling import make_dict_from_sspe
+    path = tmp_path / "log.sspe"
+    path.write_bytes(text.encode())
+    expected = make_dict_from_sspe(str(path), fast=False)
+    assert same(make_dict_from_sspe(str(path), fast=True), expected)
@@ -0,0 +1,42 @@
+"""
+Tests of the lazy namespace of the package
+"""
+import sys
+import subprocess
+
+def run(code: str) -> None:
+    """
+    Run code in a fresh interpreter, in which
+    nothing of plotwist is imported yet.
+    """
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+def test_decorate_is_the_function_after_importing_the_submodule():
+    run("from plotwist.decorate import format_large_numbers\n"
+        "import plotwist\n"
+        "from plotwist import decorate\n"
+        "assert callable(plotwist.decorate) and callable(decorate)\n"
+        "assert decorate.__name__ == 'decorate'\n")
+
+def test_decorate_is_the_function_after_using_another_name():
+    run("import plotwist\n"
+        "plotwist.C\n"
+        "import plotwist.decorate\n"
+        "assert callable(plotwist.decorate)\n")
+
+def test_import_does_not_load_matplotlib():
+    run("import sys, plotwist\n"
+        "plotwist.TimePrint\n"
+        "assert 'matplotlib' not in sys.modules\n")
+
+def test_style_is_used_by_figures_made_with_pyplot_alone():
+    run("import plotwist as ptw\n"
+        "import matplotlib.pyplot as plt\n"
+        "line, = plt.plot([0, 1])\n"
+        "assert line.get_color() == '#003049', line.get_color()\n")
+
+def test_style_is_used_when_matplotlib_was_imported_first():
+    run("import matplotlib.pyplot as plt\n"
+        "import plotwist as ptw\n"
+        "line, = plt.plot([0, 1])\n"
+        "assert line.get_color() == '#003049', line.get_color()\n")
@@ -0,0 +1,47 @@
+"""
+Tests of pushing reports
+"""
+import os
+from plotwist.make_and_push import Transport, delta_push
+
+class RecordingTransport(Transport):
+    def __init__(self):
+        self.calls = []
+
+    def put(self, source, paths):
+        self.calls += [("put", path) for path in paths]
+
+    def delete(self, paths):
+        self.calls += [("delete", path) for path in paths]
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write(text)
+
+def test_delta_push_uploads_plots_before_pages(tmp_path):
+    report = str(tmp_path / "report")
+    write(f"{report}/plots/old.svg", "old")
+    delta_push(report, "dest", RecordingTransport())
+    os.remove(f"{report}/plots/old.svg")
+    write(f"{report}/index.html", "index")
+    write(f"{report}/page_1.html", "page")
+    write(f"{report}/plots/plot_0.svg", "plot")
+    write(f"{report}/plots/plot_0.html", "interactive plot")
+    transport = RecordingTransport()
+    stats = delta_push(report, "dest", transport)
+    assert transport.calls == [
+        ("put", "report/plots/plot_0.html"),
+        ("put", "report/plots/plot_0.svg"),
+        ("put", "report/page_1.html"),
+        ("put", "report/index.html"),
+        ("delete", "report/plots/old.svg"),
+    ]
+    assert stats["files"] == 4 and stats["deleted"] == 1
+
+def test_module_runs_as_a_file():
+    # python plotwist/make_and_push.py runs the file outside of the package
+    import runpy
+    import plotwist.make_and_push
+    module = runpy.run_path(plotwist.make_and_push.__file__)
+    assert "delta_push" in module
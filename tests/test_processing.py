@@ -0,0 +1,136 @@
+"""
+Tests of the signal processing functions
+"""
+import numpy as np
+import pytest
+from plotwist.processing import moving_average
+
+def reference_moving_average(signal: np.ndarray, n: int) -> np.ndarray:
+    """
+    The moving average as a loop over the windows.
+    """
+    averages = np.zeros(len(signal))
+    for i in range(len(signal)):
+        delta = min([i, len(signal) - (i + 1), n // 2])
+        averages[i] = 1 / (1 + 2 * delta) * np.sum(signal[i - delta:i + delta + 1])
+    return averages
+
+def signal(length: int, special: dict) -> np.ndarray:
+    values = np.random.default_rng(length).normal(size=length) * 100
+    for idx, value in special.items():
+        if idx < length:
+            values[idx] = value
+    return values
+
+@pytest.mark.parametrize("n", [1, 2, 5, 10, 51, 1000])
+@pytest.mark.parametrize("length", [0, 1, 7, 200])
+@pytest.mark.parametrize("special", [
+    {},
+    {0: np.nan},
+    {3: np.inf},
+    {5: -np.inf},
+    {2: np.inf, 6: -np.inf},
+    {1: np.nan, 150: np.inf},
+], ids=["finite", "nan", "inf", "-inf", "inf and -inf", "nan and inf"])
+def test_moving_average_matches_loop(n, length, special):
+    values = signal(length, special)
+    with np.errstate(invalid="ignore"):
+        expected = reference_moving_average(values, n)
+    np.testing.assert_allclose(moving_average(values, n), expected,
+                               rtol=1e-9, atol=1e-9)
+
+def test_moving_average_along_axis():
+    values = signal(300, {10: np.nan}).reshape(3, 100)
+    averages = moving_average(values.T, 9, axis=0).T
+    for row, average in zip(values, averages):
+        np.testing.assert_allclose(average, reference_moving_average(row, 9),
+                                   rtol=1e-9, atol=1e-9)
+
+def absolute_distance(signal1: np.ndarray, signal2: np.ndarray) -> float:
+    return float(np.mean(np.abs(signal1 - signal2)))
+
+def test_custom_distance_runs_in_process(monkeypatch):
+    from plotwist import processing
+    def no_pool(*args, **kwargs):
+        raise AssertionError("A process pool was started")
+    monkeypatch.setattr(processing, "ProcessPoolExecutor", no_pool)
+    reference = np.sin(np.arange(200) / 10)
+    signals = [reference[3:], reference[5:150]]
+    _, shifts = processing.multi_signal_best_shift_mean_distance(
+        reference, signals, 10, absolute_distance)
+    _, expected = processing.multi_signal_best_shift_mean_distance(
+        reference, signals, 10, absolute_distance, batched=False)
+    assert shifts == expected
+
+def shift_signals(kind: str, length1: int, length2: int) -> tuple:
+    """
+    Returns a reference signal and a shifted, noisy copy of a part of it.
+    """
+    rng = np.random.default_rng(length1 + length2)
+    if kind == "constant":
+        return np.full(length1, 2.0), np.full(length2, 2.0)
+    if kind == "integer":
+        signal1 = rng.integers(-5, 5, size=length1)
+        noise = rng.integers(-1, 2, size=length2)
+    else:
+        signal1 = np.sin(np.arange(length1) / 7) + 0.1 * rng.normal(size=length1)
+        noise = 0.1 * rng.normal(size=length2)
+    signal2 = np.roll(signal1, -5)[:length2] + noise
+    if kind == "large offset":
+        signal1, signal2 = signal1 + 1e9, signal2 + 1e9
+    return signal1, signal2
+
+def same_result(result, expected) -> bool:
+    """
+    Whether two (shift, distance) results are identical (also if nan).
+    """
+    return result[0] == expected[0] and (result[1] == expected[1] or
+                                         (np.isnan(result[1]) and np.isnan(expected[1])))
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("distance", ["mean_squared_signal_distance",
+                                      "correlation_signal_distance"])
+@pytest.mark.parametrize("kind", ["float", "integer", "constant", "large offset"])
+@pytest.mark.parametrize("length1, length2, max_shift", [
+    (100, 60, 30),
+    (100, 100, 10),
+    (50, 40, 80),
+    (30, 1, 40),
+])
+def test_fft_shift_matches_loop(distance, kind, length1, length2, max_shift):
+    from plotwist import processing
+    distance = getattr(processing, distance)
+    signal1, signal2 = shift_signals(kind, length1, length2)
+    expected = processing.find_best_shift(signal1, signal2, max_shift, distance,
+                                          engine="loop")
+    result = processing.find_best_shift(signal1, signal2, max_shift, distance,
+                                        engine="fft")
+    assert same_result(result, expected), (result, expected)
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("distance", ["mean_squared_signal_distance",
+                                      "correlation_signal_distance"])
+@pytest.mark.parametrize("kind", ["float", "integer", "large offset"])
+@pytest.mark.parametrize("batch_size", [2**22, 100])
+def test_batched_shifts_match_loop(monkeypatch, distance, kind, batch_size):
+    from plotwist import processing
+    # A small batch size scores the signals in several batches
+    monkeypatch.setattr(processing, "BATCH_SIZE", batch_size)
+    distance = getattr(processing, distance)
+    signal1, _ = shift_signals(kind, 120, 0)
+    signals = [shift_signals(kind, 120, length)[1] for length in [90, 40, 60, 1, 100]]
+    expected = [processing.find_best_shift(signal1, signal, 50, distance, engine="loop")
+                for signal in signals]
+    results = processing._best_shifts_batched(signal1, signals, 50, distance)
+    assert all(same_result(result, exp) for result, exp in zip(results, expected)), \
+        (results, expected)
+
+def test_shifts_in_worker_processes_match_loop():
+    from plotwist import processing
+    signal1, _ = shift_signals("float", 120, 0)
+    signals = [shift_signals("float", 120, length)[1] for length in [90, 40, 60]]
+    expected = processing.multi_signal_best_shift_mean_distance(
+        signal1, signals, 20, absolute_distance, batched=False)
+    result = processing.multi_signal_best_shift_mean_distance(
+        signal1, signals, 20, absolute_distance, workers=2)
+    assert result == expected
@@ -0,0 +1,40 @@
+"""
+Tests of the compilation of reports
+"""
+import os
+import pytest
+import matplotlib.pyplot as plt
+from plotwist import cache, plot, program
+from plotwist.instructions import title
+
+def build_report(**kwargs) -> None:
+    """
+    Make a report with one plot in the working directory.
+    """
+    plot.plot_idx = 0
+    plt.plot([0, 1, 2], [1, 3, 2])
+    plot.add_fig()
+    plt.close("all")
+    program.make(**kwargs)
+
+def test_incremental_build_links_unchanged_plots(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache, "directory", None)
+    cache.figure_cache(str(tmp_path / "cache"))
+    build_report(incremental=True)
+    build_report(incremental=True)
+    assert os.path.islink("report")
+    # The plot of the second build is the file in the cache
+    plot_ = os.stat("report/plots/plot_0.svg")
+    (entry,) = os.scandir(cache.directory)
+    assert (plot_.st_dev, plot_.st_ino) == (entry.stat().st_dev, entry.stat().st_ino)
+    assert len(os.listdir(".report.builds")) == 1
+
+@pytest.mark.parametrize("kwargs", [{"split": "section"}, {"max_items": 0}])
+def test_make_rejects_unknown_splits(tmp_path, monkeypatch, kwargs):
+    monkeypatch.chdir(tmp_path)
+    title("Title")
+    with pytest.raises(ValueError):
+        program.make(incremental=True, **kwargs)
+    program.program.clear()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,49 @@
+"""
+Tests of the rendering of figures
+"""
+import os
+import pickle
+import warnings
+import pytest
+import matplotlib.pyplot as plt
+from plotwist import render
+from plotwist.decorate import decorate
+
+@pytest.fixture
+def pool():
+    render.parallel_rendering(2)
+    yield
+    render.parallel_rendering(0)
+
+def test_decorated_figure_is_rendered_in_the_background(tmp_path, pool, monkeypatch):
+    fig, ax = plt.subplots()
+    ax.plot([0, 1, 2], [1e6, 3e6, 2e6], label="line")
+    decorate(ax)
+    labels = [label.get_text() for label in ax.yaxis.get_ticklabels()]
+    # The decorated figure can be pickled with its tick formatters
+    copy = pickle.loads(pickle.dumps(fig))
+    assert [label.get_text() for label in copy.axes[0].yaxis.get_ticklabels()] == labels
+    monkeypatch.setattr(render, "warned", False)
+    path = str(tmp_path / "plot.svg")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", UserWarning)
+        render.render(fig, path)
+    assert len(render.pending) == 1
+    render.wait()
+    plt.close(fig)
+    assert os.path.getsize(path) > 0
+
+def test_unpicklable_figure_with_parallel_rendering(tmp_path, pool, monkeypatch):
+    monkeypatch.setattr(render, "warned", False)
+    paths = [str(tmp_path / f"plot_{idx}.svg") for idx in range(2)]
+    with pytest.warns(UserWarning, match="can not be pickled") as record:
+        for path in paths:
+            fig, ax = plt.subplots()
+            ax.plot([0, 1, 2], [1, 3, 2])
+            ax.xaxis.set_major_formatter(lambda x, pos: f"{x}")
+            render.render(fig, path)
+            plt.close(fig)
+    render.wait()
+    # Only the first figure is warned about
+    assert len(record) == 1
+    assert all(os.path.getsize(path) > 0 for path in paths)